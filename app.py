@@ -2,14 +2,19 @@ import streamlit as st
 import pandas as pd
 import os
 import time
-from email_sender import EmailSender
-from gmail_sender import GmailSender
-from utils import validate_email, validate_csv_columns, process_uploaded_file
-import threading
-import queue
+from utils import validate_email, validate_csv_columns, process_uploaded_file, get_template_contacts, contact_records, encode_attachments
+from send_worker import SendJob, SendLog, SendWorker, new_send_status
 import json
 import hashlib
-import random
+import secrets
+import io
+from types import MappingProxyType
+from typing import Mapping
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib json parser is used otherwise
+    orjson = None
 
 # Page configuration
 st.set_page_config(
@@ -20,7 +25,7 @@ st.set_page_config(
 )
 
 # Custom CSS for background image
-st.markdown("""
+_CSS = """
     <style>
     .stApp {
         background-image: url("https://jazzy-cocada-7b049f.netlify.app/t%C3%A9l%C3%A9chargement.png");
@@ -68,13 +73,164 @@ st.markdown("""
         border: 1px solid rgba(0, 0, 0, 0.2) !important;
     }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(_CSS, unsafe_allow_html=True)
+
+# Long help texts for the Gmail API authentication steps
+_AUTH_STEPS_GUIDE = """
+**Étape 2 :** Google va vous montrer une page avec des permissions à autoriser
+
+**Étape 3 :** 🚨 **CRITIQUE** - Vous DEVEZ cocher **TOUTES** les cases suivantes :
+- ✅ **"Afficher l'adresse e-mail associée à votre compte"**
+- ✅ **"Afficher vos e-mails et paramètres de messagerie"** 
+- ✅ **"Envoyer des e-mails en votre nom"** ← **ESSENTIEL pour l'envoi**
+
+**Étape 4 :** Cliquez sur **"Continuer"** ou **"Allow"**
+
+**Étape 5 :** Google va afficher un code d'autorisation - copiez-le ENTIÈREMENT
+
+**⚠️ ATTENTION :** Si vous ne cochez pas TOUTES les cases, l'authentification échouera !
+"""
+
+_MISSING_SEND_SOLUTION = """
+**Ce qui s'est passé :**
+- ❌ Vous avez décoché ou refusé la permission d'envoi d'emails
+- ✅ Votre Google Cloud Console est bien configuré (comme votre capture d'écran le montre)
+- ❌ Mais vous n'avez pas autorisé toutes les permissions lors de l'OAuth
+
+**Solution :**
+1. Cliquez sur **'Reset'** ci-dessus
+2. Générez un nouveau lien d'autorisation
+3. **IMPORTANT** : Cette fois, cochez **TOUTES** les 3 cases :
+   - ✅ Afficher l'adresse e-mail
+   - ✅ Afficher vos e-mails et paramètres  
+   - ✅ **Envoyer des e-mails en votre nom** ← OBLIGATOIRE
+4. Cliquez "Continuer" puis collez le nouveau code
+"""
+
+_TROUBLESHOOTING_GUIDE = """
+**Causes fréquentes :**
+- ⏰ **Code expiré** : Les codes Google expirent en 10 minutes
+- 🔄 **Code déjà utilisé** : Chaque code ne peut être utilisé qu'une seule fois
+- 🔐 **Problème de permissions** : Configuration OAuth incorrecte
+- 📱 **Format incorrect** : Copiez le code complet sans espaces supplémentaires
+
+**Solutions :**
+1. Cliquez sur **'Reset'** pour effacer l'ancien token
+2. Cliquez sur **'Générer le lien d'autorisation'** pour un nouveau lien
+3. Suivez le lien **immédiatement** après génération
+4. Copiez le code **entier** sans modifications
+5. Collez le code et finalisez **rapidement**
+
+**Note** : Si le problème persiste, vérifiez votre fichier credentials.json et la configuration OAuth dans Google Console.
+"""
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _parse_contacts(file_bytes: bytes, name: str) -> pd.DataFrame:
+    """
+    Parse an uploaded contacts file, cached on its content.
+
+    Streamlit hashes ``file_bytes``, so reruns with the same upload skip
+    the pandas parsing entirely.
+
+    Args:
+        file_bytes: Raw content of the uploaded file
+        name: Original file name (used to detect the format)
+
+    Returns:
+        pd.DataFrame: Processed DataFrame with contact data
+    """
+    buffer = io.BytesIO(file_bytes)
+    buffer.name = name
+    return process_uploaded_file(buffer, warn=st.warning, info=st.info)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _logs_csv(version: int, status_filter: str, _logs_df: pd.DataFrame) -> bytes:
+    """
+    Encode the displayed send history as CSV, cached per log version and filter.
+
+    ``_logs_df`` is not hashed by Streamlit: ``version`` identifies its content,
+    so reruns that don't add log entries reuse the encoded bytes.
+
+    Args:
+        version: SendLog version the DataFrame was built from
+        status_filter: Status filter applied to the DataFrame
+        _logs_df: Filtered send history
+
+    Returns:
+        bytes: UTF-8 CSV content for the download button
+    """
+    return _logs_df.to_csv(index=False).encode('utf-8')
+
+def _email_sender_cls():
+    """Import the SMTP sender only once the SMTP method is used."""
+    from email_sender import EmailSender
+    return EmailSender
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _get_email_sender(smtp_config: tuple):
+    """
+    Return the shared EmailSender for an SMTP configuration.
+
+    Args:
+        smtp_config: EmailSender constructor arguments, in order
+
+    Returns:
+        EmailSender: Sender reused by connection test, preview and bulk send
+    """
+    return _email_sender_cls()(*smtp_config)
+
+def _gmail_sender_cls():
+    """Import the Gmail API sender (and the Google client libraries) only when selected."""
+    from gmail_sender import GmailSender
+    return GmailSender
+
+# Seconds between progress refreshes while a bulk send runs in the background
+_PROGRESS_REFRESH_SECONDS = 1.0
+
+@st.cache_resource
+def _get_send_worker() -> SendWorker:
+    """Return the process-wide background send worker."""
+    return SendWorker()
+
+# Environment variables used as form defaults, with their fallback values
+_ENV_DEFAULTS = (
+    ("SMTP_SERVER", "smtp.gmail.com"),
+    ("SMTP_PORT", "587"),
+    ("SENDER_EMAIL", ""),
+    ("SENDER_PASSWORD", ""),
+    ("SENDER_NAME", ""),
+    ("REPLY_TO_EMAIL", ""),
+    ("GMAIL_SENDER_NAME", ""),
+)
+
+# SMTP account inputs: (variable, label, environment default, extra text_input options)
+_SMTP_ACCOUNT_FIELDS = (
+    ("sender_email", "Email expéditeur", "SENDER_EMAIL", {
+        "help": "Votre adresse email"
+    }),
+    ("sender_password", "Mot de passe", "SENDER_PASSWORD", {
+        "type": "password",
+        "help": "Mot de passe ou mot de passe d'application"
+    }),
+    ("sender_name", "Nom de l'expéditeur", "SENDER_NAME", {
+        "help": "Nom qui apparaîtra dans l'email"
+    }),
+    ("reply_to_email", "Email de réponse (Reply-To)", "REPLY_TO_EMAIL", {
+        "help": "Adresse email sur laquelle les destinataires pourront répondre (laissez vide pour utiliser l'email expéditeur)",
+        "placeholder": "exemple@domaine.com"
+    }),
+)
+
+@st.cache_resource
+def _get_env() -> Mapping[str, str]:
+    """Return a read-only snapshot of the form defaults, read from the environment once per process."""
+    return MappingProxyType({name: os.getenv(name, default) for name, default in _ENV_DEFAULTS})
 
 # Create unique session ID for each user
 if 'session_id' not in st.session_state:
-    # Create unique session ID using timestamp and random number
-    session_data = f"{time.time()}_{random.randint(1000, 9999)}"
-    st.session_state.session_id = hashlib.md5(session_data.encode()).hexdigest()[:8]
+    st.session_state.session_id = secrets.token_hex(4)
 
 # Initialize session state
 if 'email_sender' not in st.session_state:
@@ -83,14 +239,231 @@ if 'gmail_sender' not in st.session_state:
     st.session_state.gmail_sender = None
 if 'contacts_df' not in st.session_state:
     st.session_state.contacts_df = None
+if 'contacts_hash' not in st.session_state:
+    st.session_state.contacts_hash = None
+if 'contacts_valid' not in st.session_state:
+    st.session_state.contacts_valid = False
+if 'contacts_preview' not in st.session_state:
+    st.session_state.contacts_preview = None
+if 'contacts_summary' not in st.session_state:
+    st.session_state.contacts_summary = (0, '')
+if 'preview_records' not in st.session_state:
+    st.session_state.preview_records = []
 if 'sending_status' not in st.session_state:
-    st.session_state.sending_status = {'active': False, 'progress': 0, 'total': 0, 'success': 0, 'errors': []}
+    st.session_state.sending_status = new_send_status()
 if 'send_logs' not in st.session_state:
-    st.session_state.send_logs = []
+    st.session_state.send_logs = SendLog()
 if 'send_method' not in st.session_state:
     st.session_state.send_method = 'SMTP'
 if 'attachments' not in st.session_state:
     st.session_state.attachments = []
+if 'attachments_key' not in st.session_state:
+    st.session_state.attachments_key = None
+if 'credentials_hash' not in st.session_state:
+    st.session_state.credentials_hash = None
+if 'credentials_content' not in st.session_state:
+    st.session_state.credentials_content = None
+
+@st.fragment
+def _gmail_auth_code_step(gmail_sender_cls, gmail_sender_name: str):
+    """
+    Render step 2 of the Gmail authentication, the authorization code entry.
+
+    Running as a fragment, typing the code only reruns this block instead of
+    the whole page; finishing or resetting the flow triggers a full rerun.
+
+    Args:
+        gmail_sender_cls: GmailSender class, used when the session is reset
+        gmail_sender_name: Sender name for a recreated GmailSender
+    """
+    col_auth1, col_auth2 = st.columns([3, 1])
+
+    with col_auth1:
+        auth_code = st.text_input(
+            "Code d'autorisation Google",
+            help="Copiez le code complet de la page d'autorisation Google (commençant généralement par '4/')",
+            placeholder="4/0AcvDMrXXXXXXXXXXXXXXXXXXXXXX..."
+        )
+        
+        # Add validation hints
+        if auth_code:
+            if len(auth_code.strip()) < 10:
+                st.warning("⚠️ Le code semble trop court. Assurez-vous de copier le code complet.")
+            elif not auth_code.strip().startswith(('4/', '1/')):
+                st.info("💡 Les codes d'autorisation commencent généralement par '4/' ou '1/'")
+            else:
+                st.success("✅ Format du code validé")
+
+    with col_auth2:
+        if st.button("🔄 Nouveau lien"):
+            # Clear the current auth URL to force regeneration
+            if hasattr(st.session_state, 'auth_url'):
+                delattr(st.session_state, 'auth_url')
+            st.rerun()
+
+    if st.button("🔐 Étape 2: Finaliser l'authentification"):
+        if auth_code and len(auth_code.strip()) > 5:
+            with st.spinner("Finalisation de l'authentification..."):
+                success = st.session_state.gmail_sender.complete_authentication(auth_code)
+                if success:
+                    st.success("✅ Authentification Gmail API réussie!")
+                    # Clean up auth URL
+                    if hasattr(st.session_state, 'auth_url'):
+                        delattr(st.session_state, 'auth_url')
+                    st.rerun()  # Refresh the page to show success
+                else:
+                    # Display specific error message based on error type
+                    error_type = getattr(st.session_state.gmail_sender, 'last_auth_error', 'UNKNOWN_ERROR')
+                    
+                    if error_type == "CODE_EXPIRED_OR_INVALID":
+                        st.error("❌ Code d'autorisation invalide ou expiré.")
+                        st.info("⏰ **Solution** : Générez un nouveau lien d'autorisation et utilisez le code immédiatement.")
+                    elif error_type == "MISSING_GMAIL_SEND":
+                        st.error("❌ Permissions insuffisantes pour envoyer des emails.")
+                        st.warning("🚫 **Cause** : Vous avez refusé la permission 'Envoyer des e-mails en votre nom'")
+                        
+                        with st.expander("🔧 Solution détaillée", expanded=True):
+                            st.markdown(_MISSING_SEND_SOLUTION)
+                    elif error_type == "SCOPE_MISMATCH":
+                        st.error("❌ Problème de permissions détecté.")
+                        st.warning("🔐 **Action requise** : Les permissions ont changé. Cliquez sur 'Reset' puis générez un nouveau lien d'autorisation.")
+                        st.info("💡 **Important** : Assurez-vous d'autoriser TOUTES les permissions demandées par Google (email + envoi Gmail).")
+                        
+                        # Auto-reset pour simplifier le processus
+                        if st.button("🔄 Auto-Reset et Regénérer", type="primary"):
+                            # Clear Gmail sender completely
+                            if st.session_state.gmail_sender:
+                                st.session_state.gmail_sender.clear_token()
+                            st.session_state.gmail_sender = None
+                            if hasattr(st.session_state, 'auth_url'):
+                                delattr(st.session_state, 'auth_url')
+                            # Recreate Gmail sender
+                            st.session_state.gmail_sender = gmail_sender_cls(sender_name=gmail_sender_name, session_id=st.session_state.session_id)
+                            st.session_state.gmail_sender.last_auth_error = None
+                            st.success("✅ Session réinitialisée ! Cliquez maintenant sur 'Générer le lien d'autorisation'")
+                            st.rerun()
+                    elif error_type == "REDIRECT_MISMATCH":
+                        st.error("❌ Problème de configuration OAuth.")
+                        st.warning("🔧 **Configuration requise** : Vérifiez la configuration de votre Console Google.")
+                    elif error_type == "INVALID_CREDENTIALS":
+                        st.error("❌ Fichier credentials.json invalide.")
+                        st.warning("📄 **Solution** : Vérifiez et re-téléchargez votre fichier credentials.json.")
+                    else:
+                        st.error("❌ Code d'autorisation invalide ou expiré.")
+                        st.warning("⚠️ Problème de permissions détecté. Cliquez sur 'Reset' puis générez un nouveau lien d'autorisation.")
+                    
+                    with st.expander("🔍 Guide de dépannage complet"):
+                        st.markdown(_TROUBLESHOOTING_GUIDE)
+        else:
+            st.warning("⚠️ Veuillez entrer le code d'autorisation.")
+
+@st.fragment
+def _send_logs_panel():
+    """
+    Render the send history with its status filter and download button.
+
+    As a fragment, changing the filter only reruns this panel.
+    """
+    st.markdown("---")
+    st.header("📋 Historique des Envois")
+
+    # Build the DataFrame straight from the log columns; the few status values share a category
+    logs_version, logs_columns = st.session_state.send_logs.versioned_snapshot()
+    logs_df = pd.DataFrame(logs_columns)
+    logs_df['status'] = logs_df['status'].astype('category')
+
+    # Filter options
+    col5, col6 = st.columns([1, 3])
+
+    with col5:
+        status_filter = st.selectbox(
+            "Filtrer par statut",
+            ["Tous", "Succès", "Échec", "Erreur"]
+        )
+
+    # Apply filter
+    if status_filter != "Tous":
+        filtered_logs = logs_df[logs_df['status'] == status_filter]
+    else:
+        filtered_logs = logs_df
+
+    # Display logs
+    st.dataframe(
+        filtered_logs,
+        use_container_width=True,
+        column_config={
+            'email': 'Email',
+            'status': 'Statut',
+            'timestamp': 'Heure',
+            'error': 'Erreur'
+        }
+    )
+
+    # Download logs
+    csv = _logs_csv(logs_version, status_filter, filtered_logs)
+    st.download_button(
+        label="💾 Télécharger les logs",
+        data=csv,
+        file_name=f"email_logs_{time.strftime('%Y%m%d_%H%M%S')}.csv",
+        mime="text/csv"
+    )
+
+    # Clear logs button
+    if st.button("🗑️ Effacer l'historique"):
+        # Clear in place: a running send job still appends to this list
+        st.session_state.send_logs.clear()
+        st.rerun()
+
+@st.fragment(run_every=_PROGRESS_REFRESH_SECONDS)
+def _send_activity_panel():
+    """Show the latest event of the running bulk send and its stop button."""
+    last_event = st.session_state.sending_status.get('last_event')
+    if last_event:
+        level, message = last_event
+        getattr(st, level)(message)
+
+    if st.button("⏹️ Arrêter l'Envoi", type="secondary"):
+        st.session_state.sending_status['active'] = False
+        st.rerun()
+
+def _send_status_panel(live: bool):
+    """
+    Render the progress bar and counters of the current or last bulk send.
+
+    Wrapped with st.fragment by main(), polling only while a send runs, so
+    progress updates no longer rerun the whole page.
+
+    Args:
+        live: Whether the panel was rendered while the send was running
+    """
+    sending_status = st.session_state.sending_status
+    if live and not sending_status['active']:
+        # The job just ended: rerun the page to restore the send button and history
+        st.rerun()
+
+    st.subheader("📊 Statut d'Envoi")
+
+    progress = sending_status['progress']
+    total = sending_status['total']
+    success = sending_status['success']
+    errors = sending_status['error_count']
+
+    # Progress bar
+    progress_percentage = progress / total if total > 0 else 0
+    st.progress(progress_percentage)
+
+    # Stats
+    st.metric("Progression", f"{progress}/{total}")
+    st.metric("Succès", success)
+    st.metric("Erreurs", errors)
+
+    if sending_status['active']:
+        st.info("🔄 Envoi en cours...")
+    else:
+        if progress == total:
+            st.success("✅ Envoi terminé!")
+        else:
+            st.warning("⚠️ Envoi interrompu")
 
 def main():
     st.title("📧 LBK-DevTools Sender")
@@ -104,15 +477,16 @@ def main():
     st.markdown("---")
 
     # Initialize variables with defaults
-    smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
+    env = _get_env()
+    smtp_server = env["SMTP_SERVER"]
+    smtp_port = int(env["SMTP_PORT"])
     use_tls = True
     use_ssl = False
-    sender_email = os.getenv("SENDER_EMAIL", "")
-    sender_password = os.getenv("SENDER_PASSWORD", "")
-    sender_name = os.getenv("SENDER_NAME", "")
+    sender_email = env["SENDER_EMAIL"]
+    sender_password = env["SENDER_PASSWORD"]
+    sender_name = env["SENDER_NAME"]
     reply_to_email = ""
-    gmail_sender_name = os.getenv("GMAIL_SENDER_NAME", "")
+    gmail_sender_name = env["GMAIL_SENDER_NAME"]
 
     # Sidebar for email configuration
     with st.sidebar:
@@ -153,8 +527,8 @@ def main():
                 default_port = preset["port"]
                 default_security = preset["security"]
             else:
-                default_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-                default_port = int(os.getenv("SMTP_PORT", "587"))
+                default_server = env["SMTP_SERVER"]
+                default_port = int(env["SMTP_PORT"])
                 default_security = "STARTTLS"
 
             smtp_server = st.text_input(
@@ -181,40 +555,23 @@ def main():
             use_tls = security_type == "STARTTLS"
             use_ssl = security_type == "SSL"
 
-            sender_email = st.text_input(
-                "Email expéditeur",
-                value=os.getenv("SENDER_EMAIL", ""),
-                help="Votre adresse email"
-            )
-
-            sender_password = st.text_input(
-                "Mot de passe",
-                type="password",
-                value=os.getenv("SENDER_PASSWORD", ""),
-                help="Mot de passe ou mot de passe d'application"
-            )
-
-            sender_name = st.text_input(
-                "Nom de l'expéditeur",
-                value=os.getenv("SENDER_NAME", ""),
-                help="Nom qui apparaîtra dans l'email"
-            )
-
-            reply_to_email = st.text_input(
-                "Email de réponse (Reply-To)",
-                value=os.getenv("REPLY_TO_EMAIL", ""),
-                help="Adresse email sur laquelle les destinataires pourront répondre (laissez vide pour utiliser l'email expéditeur)",
-                placeholder="exemple@domaine.com"
-            )
+            account = {
+                key: st.text_input(label, value=env[env_name], **options)
+                for key, label, env_name, options in _SMTP_ACCOUNT_FIELDS
+            }
+            sender_email = account["sender_email"]
+            sender_password = account["sender_password"]
+            sender_name = account["sender_name"]
+            reply_to_email = account["reply_to_email"]
 
             # Test SMTP connection
             if st.button("🔍 Tester la Connexion SMTP"):
                 if sender_email and sender_password:
                     with st.spinner("Test de connexion..."):
-                        test_sender = EmailSender(
+                        test_sender = _get_email_sender((
                             smtp_server, smtp_port, use_tls,
                             sender_email, sender_password, sender_name, use_ssl, reply_to_email
-                        )
+                        ))
                         if test_sender.test_connection():
                             st.success("✅ Connexion SMTP réussie!")
                         else:
@@ -231,7 +588,7 @@ def main():
             # Sender name for Gmail API
             gmail_sender_name = st.text_input(
                 "Nom de l'expéditeur Gmail",
-                value=os.getenv("GMAIL_SENDER_NAME", ""),
+                value=env["GMAIL_SENDER_NAME"],
                 help="Nom qui apparaîtra dans l'email pour vos destinataires"
             )
 
@@ -246,8 +603,20 @@ def main():
 
             if credentials_file is not None:
                 try:
-                    credentials_content = credentials_file.read().decode('utf-8')
-                    credentials_data = json.loads(credentials_content)
+                    # Decode and validate the file only when a different one is uploaded
+                    credentials_bytes = credentials_file.getvalue()
+                    credentials_hash = hashlib.md5(credentials_bytes).hexdigest()
+                    if credentials_hash != st.session_state.credentials_hash:
+                        credentials_content = credentials_bytes.decode('utf-8')
+                        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+                        if orjson is not None:
+                            orjson.loads(credentials_bytes)
+                        else:
+                            json.loads(credentials_content)
+                        st.session_state.credentials_content = credentials_content
+                        st.session_state.credentials_hash = credentials_hash
+                    credentials_content = st.session_state.credentials_content
+                    GmailSender = _gmail_sender_cls()
 
                     # Initialize Gmail sender
                     if 'gmail_sender' not in st.session_state or st.session_state.gmail_sender is None:
@@ -273,20 +642,7 @@ def main():
                                 st.markdown("**1.** Cliquez sur ce lien : [Autoriser Gmail API]({})".format(auth_result))
                                 
                                 with st.expander("📖 Guide détaillé - Étapes à suivre dans Google", expanded=True):
-                                    st.markdown("""
-                                    **Étape 2 :** Google va vous montrer une page avec des permissions à autoriser
-                                    
-                                    **Étape 3 :** 🚨 **CRITIQUE** - Vous DEVEZ cocher **TOUTES** les cases suivantes :
-                                    - ✅ **"Afficher l'adresse e-mail associée à votre compte"**
-                                    - ✅ **"Afficher vos e-mails et paramètres de messagerie"** 
-                                    - ✅ **"Envoyer des e-mails en votre nom"** ← **ESSENTIEL pour l'envoi**
-                                    
-                                    **Étape 4 :** Cliquez sur **"Continuer"** ou **"Allow"**
-                                    
-                                    **Étape 5 :** Google va afficher un code d'autorisation - copiez-le ENTIÈREMENT
-                                    
-                                    **⚠️ ATTENTION :** Si vous ne cochez pas TOUTES les cases, l'authentification échouera !
-                                    """)
+                                    st.markdown(_AUTH_STEPS_GUIDE)
                                 
                                 st.warning("🔴 **ERREUR FRÉQUENTE** : Ne pas cocher toutes les permissions = échec garanti !")
 
@@ -307,116 +663,7 @@ def main():
 
                     # Step 2: Enter authorization code
                     if hasattr(st.session_state, 'auth_url'):
-                        col_auth1, col_auth2 = st.columns([3, 1])
-
-                        with col_auth1:
-                            auth_code = st.text_input(
-                                "Code d'autorisation Google",
-                                help="Copiez le code complet de la page d'autorisation Google (commençant généralement par '4/')",
-                                placeholder="4/0AcvDMrXXXXXXXXXXXXXXXXXXXXXX..."
-                            )
-                            
-                            # Add validation hints
-                            if auth_code:
-                                if len(auth_code.strip()) < 10:
-                                    st.warning("⚠️ Le code semble trop court. Assurez-vous de copier le code complet.")
-                                elif not auth_code.strip().startswith(('4/', '1/')):
-                                    st.info("💡 Les codes d'autorisation commencent généralement par '4/' ou '1/'")
-                                else:
-                                    st.success("✅ Format du code validé")
-
-                        with col_auth2:
-                            if st.button("🔄 Nouveau lien"):
-                                # Clear the current auth URL to force regeneration
-                                if hasattr(st.session_state, 'auth_url'):
-                                    delattr(st.session_state, 'auth_url')
-                                st.rerun()
-
-                        if st.button("🔐 Étape 2: Finaliser l'authentification"):
-                            if auth_code and len(auth_code.strip()) > 5:
-                                with st.spinner("Finalisation de l'authentification..."):
-                                    success = st.session_state.gmail_sender.complete_authentication(auth_code)
-                                    if success:
-                                        st.success("✅ Authentification Gmail API réussie!")
-                                        # Clean up auth URL
-                                        if hasattr(st.session_state, 'auth_url'):
-                                            delattr(st.session_state, 'auth_url')
-                                        gmail_authenticated = True
-                                        st.rerun()  # Refresh the page to show success
-                                    else:
-                                        # Display specific error message based on error type
-                                        error_type = getattr(st.session_state.gmail_sender, 'last_auth_error', 'UNKNOWN_ERROR')
-                                        
-                                        if error_type == "CODE_EXPIRED_OR_INVALID":
-                                            st.error("❌ Code d'autorisation invalide ou expiré.")
-                                            st.info("⏰ **Solution** : Générez un nouveau lien d'autorisation et utilisez le code immédiatement.")
-                                        elif error_type == "MISSING_GMAIL_SEND":
-                                            st.error("❌ Permissions insuffisantes pour envoyer des emails.")
-                                            st.warning("🚫 **Cause** : Vous avez refusé la permission 'Envoyer des e-mails en votre nom'")
-                                            
-                                            with st.expander("🔧 Solution détaillée", expanded=True):
-                                                st.markdown("""
-                                                **Ce qui s'est passé :**
-                                                - ❌ Vous avez décoché ou refusé la permission d'envoi d'emails
-                                                - ✅ Votre Google Cloud Console est bien configuré (comme votre capture d'écran le montre)
-                                                - ❌ Mais vous n'avez pas autorisé toutes les permissions lors de l'OAuth
-                                                
-                                                **Solution :**
-                                                1. Cliquez sur **'Reset'** ci-dessus
-                                                2. Générez un nouveau lien d'autorisation
-                                                3. **IMPORTANT** : Cette fois, cochez **TOUTES** les 3 cases :
-                                                   - ✅ Afficher l'adresse e-mail
-                                                   - ✅ Afficher vos e-mails et paramètres  
-                                                   - ✅ **Envoyer des e-mails en votre nom** ← OBLIGATOIRE
-                                                4. Cliquez "Continuer" puis collez le nouveau code
-                                                """)
-                                        elif error_type == "SCOPE_MISMATCH":
-                                            st.error("❌ Problème de permissions détecté.")
-                                            st.warning("🔐 **Action requise** : Les permissions ont changé. Cliquez sur 'Reset' puis générez un nouveau lien d'autorisation.")
-                                            st.info("💡 **Important** : Assurez-vous d'autoriser TOUTES les permissions demandées par Google (email + envoi Gmail).")
-                                            
-                                            # Auto-reset pour simplifier le processus
-                                            if st.button("🔄 Auto-Reset et Regénérer", type="primary"):
-                                                # Clear Gmail sender completely
-                                                if st.session_state.gmail_sender:
-                                                    st.session_state.gmail_sender.clear_token()
-                                                st.session_state.gmail_sender = None
-                                                if hasattr(st.session_state, 'auth_url'):
-                                                    delattr(st.session_state, 'auth_url')
-                                                # Recreate Gmail sender
-                                                st.session_state.gmail_sender = GmailSender(sender_name=gmail_sender_name, session_id=st.session_state.session_id)
-                                                st.session_state.gmail_sender.last_auth_error = None
-                                                st.success("✅ Session réinitialisée ! Cliquez maintenant sur 'Générer le lien d'autorisation'")
-                                                st.rerun()
-                                        elif error_type == "REDIRECT_MISMATCH":
-                                            st.error("❌ Problème de configuration OAuth.")
-                                            st.warning("🔧 **Configuration requise** : Vérifiez la configuration de votre Console Google.")
-                                        elif error_type == "INVALID_CREDENTIALS":
-                                            st.error("❌ Fichier credentials.json invalide.")
-                                            st.warning("📄 **Solution** : Vérifiez et re-téléchargez votre fichier credentials.json.")
-                                        else:
-                                            st.error("❌ Code d'autorisation invalide ou expiré.")
-                                            st.warning("⚠️ Problème de permissions détecté. Cliquez sur 'Reset' puis générez un nouveau lien d'autorisation.")
-                                        
-                                        with st.expander("🔍 Guide de dépannage complet"):
-                                            st.markdown("""
-                                            **Causes fréquentes :**
-                                            - ⏰ **Code expiré** : Les codes Google expirent en 10 minutes
-                                            - 🔄 **Code déjà utilisé** : Chaque code ne peut être utilisé qu'une seule fois
-                                            - 🔐 **Problème de permissions** : Configuration OAuth incorrecte
-                                            - 📱 **Format incorrect** : Copiez le code complet sans espaces supplémentaires
-                                            
-                                            **Solutions :**
-                                            1. Cliquez sur **'Reset'** pour effacer l'ancien token
-                                            2. Cliquez sur **'Générer le lien d'autorisation'** pour un nouveau lien
-                                            3. Suivez le lien **immédiatement** après génération
-                                            4. Copiez le code **entier** sans modifications
-                                            5. Collez le code et finalisez **rapidement**
-                                            
-                                            **Note** : Si le problème persiste, vérifiez votre fichier credentials.json et la configuration OAuth dans Google Console.
-                                            """)
-                            else:
-                                st.warning("⚠️ Veuillez entrer le code d'autorisation.")
+                        _gmail_auth_code_step(GmailSender, gmail_sender_name)
 
                     # Test Gmail API connection
                     if st.session_state.gmail_sender and st.session_state.gmail_sender.service:
@@ -450,18 +697,32 @@ def main():
 
         if uploaded_file is not None:
             try:
-                df = process_uploaded_file(uploaded_file)
-
-                if validate_csv_columns(df):
-                    st.session_state.contacts_df = df
-                    st.success(f"✅ {len(df)} contacts chargés avec succès!")
+                file_bytes = uploaded_file.getvalue()
+                contacts_hash = hashlib.md5(file_bytes).hexdigest()
+
+                # Only parse and validate genuinely new uploads
+                if st.session_state.contacts_hash != contacts_hash:
+                    df = _parse_contacts(file_bytes, uploaded_file.name)
+                    st.session_state.contacts_hash = contacts_hash
+                    st.session_state.contacts_valid = validate_csv_columns(df)
+                    if st.session_state.contacts_valid:
+                        st.session_state.contacts_df = df
+                        st.session_state.contacts_preview = df.head(10)
+                        st.session_state.contacts_summary = (len(df), ', '.join(df.columns.tolist()))
+                        # Plain string records for the email preview, cleaned like the send path's
+                        st.session_state.preview_records = contact_records(df.head(5))
+
+                if st.session_state.contacts_valid:
+                    # The display only uses the small views built at upload time
+                    contacts_count, contacts_columns = st.session_state.contacts_summary
+                    st.success(f"✅ {contacts_count} contacts chargés avec succès!")
 
                     # Display preview
                     st.subheader("Aperçu des contacts")
-                    st.dataframe(df.head(10), use_container_width=True)
+                    st.dataframe(st.session_state.contacts_preview, use_container_width=True)
 
                     # Show column info
-                    st.info(f"📊 Colonnes détectées: {', '.join(df.columns.tolist())}")
+                    st.info(f"📊 Colonnes détectées: {contacts_columns}")
 
                 else:
                     st.error("❌ Le fichier doit contenir au minimum une colonne 'email'")
@@ -518,46 +779,47 @@ def main():
         )
         
         if uploaded_attachments:
-            st.session_state.attachments = []
-            total_size = 0
-            for uploaded_file in uploaded_attachments:
-                file_content = uploaded_file.read()
-                file_size = len(file_content)
-                total_size += file_size
-                st.session_state.attachments.append({
-                    'filename': uploaded_file.name,
-                    'content': file_content
-                })
-                uploaded_file.seek(0)
+            # Only re-read the files when the set of uploads changed
+            attachments_key = tuple(f.file_id for f in uploaded_attachments)
+            if st.session_state.attachments_key != attachments_key:
+                st.session_state.attachments = encode_attachments([
+                    {'filename': f.name, 'content': f.getvalue()}
+                    for f in uploaded_attachments
+                ])
+                st.session_state.attachments_key = attachments_key
+            total_size = sum(att['size'] for att in st.session_state.attachments)
             
             st.success(f"✅ {len(uploaded_attachments)} fichier(s) ajouté(s) ({total_size / 1024:.2f} KB au total)")
             
             with st.expander("📋 Voir les fichiers ajoutés"):
                 for att in st.session_state.attachments:
-                    st.text(f"• {att['filename']} ({len(att['content']) / 1024:.2f} KB)")
+                    st.text(f"• {att['filename']} ({att['size'] / 1024:.2f} KB)")
         else:
             st.session_state.attachments = []
+            st.session_state.attachments_key = None
         
         # Preview section
         if st.session_state.contacts_df is not None and email_content and email_subject:
             st.subheader("👀 Aperçu de l'email")
 
-            # Select a contact for preview
+            # Select a contact for preview among the records built at upload time
+            preview_records = st.session_state.preview_records
+            preview_emails = [record.get('email', 'Email non trouvé') for record in preview_records]
             preview_index = st.selectbox(
                 "Choisir un contact pour l'aperçu",
-                range(min(5, len(st.session_state.contacts_df))),
-                format_func=lambda x: f"{st.session_state.contacts_df.iloc[x].get('email', 'Email non trouvé')}"
+                range(len(preview_records)),
+                format_func=lambda x: f"{preview_emails[x]}"
             )
 
             if st.button("🔍 Générer l'aperçu"):
-                contact = st.session_state.contacts_df.iloc[preview_index]
+                contact = preview_records[preview_index]
 
                 # Create email sender for preview based on method
                 if st.session_state.send_method == "SMTP":
-                    preview_sender = EmailSender(
+                    preview_sender = _get_email_sender((
                         smtp_server, smtp_port, use_tls,
                         sender_email, sender_password, sender_name, use_ssl, reply_to_email
-                    )
+                    ))
                     preview_subject, preview_content = preview_sender.prepare_email_content(
                         email_subject, email_content, contact
                     )
@@ -609,97 +871,52 @@ def main():
                 help="Délai pour éviter d'être marqué comme spam"
             )
 
+            # Parallel sends reuse pooled SMTP connections; the Gmail API client is not thread-safe
+            parallel_sends = 1
+            if st.session_state.send_method == "SMTP":
+                parallel_sends = st.number_input(
+                    "Envois simultanés",
+                    min_value=1,
+                    max_value=10,
+                    value=4,
+                    help="Nombre de connexions SMTP utilisées en parallèle (le délai entre les emails reste respecté)"
+                )
+
             if not st.session_state.sending_status['active']:
                 if st.button("📤 Lancer l'Envoi en Masse", type="primary"):
                     # Initialize email sender based on method
                     if st.session_state.send_method == "SMTP":
-                        st.session_state.email_sender = EmailSender(
+                        st.session_state.email_sender = _get_email_sender((
                             smtp_server, smtp_port, use_tls,
                             sender_email, sender_password, sender_name, use_ssl, reply_to_email
-                        )
-                    # Gmail sender is already initialized
+                        ))
+                        sender = st.session_state.email_sender
+                    else:  # Gmail API
+                        # Gmail sender is already initialized, update sender name before sending
+                        st.session_state.gmail_sender.sender_name = gmail_sender_name
+                        sender = st.session_state.gmail_sender
+
+                    # Render from only the columns the templates reference
+                    contacts = get_template_contacts(st.session_state.contacts_df, email_subject, email_content)
 
                     # Start sending process
-                    st.session_state.sending_status = {
-                        'active': True,
-                        'progress': 0,
-                        'total': len(st.session_state.contacts_df),
-                        'success': 0,
-                        'errors': []
-                    }
-
-                    # Process emails one by one with real-time updates
-                    progress_bar = st.progress(0)
-                    status_placeholder = st.empty()
-                    
-                    for index, contact in st.session_state.contacts_df.iterrows():
-                        if not st.session_state.sending_status['active']:
-                            break
-
-                        current_email = contact.get('email', '')
-                        status_placeholder.info(f"📧 Envoi vers: {current_email}")
-
-                        try:
-                            # Choose sender based on method
-                            if st.session_state.send_method == "SMTP":
-                                success = st.session_state.email_sender.send_email(
-                                    contact.to_dict(), email_subject, email_content, content_type == "HTML",
-                                    st.session_state.attachments if st.session_state.attachments else None
-                                )
-                            else:  # Gmail API
-                                # Update sender name before sending
-                                if st.session_state.gmail_sender:
-                                    st.session_state.gmail_sender.sender_name = gmail_sender_name
-                                    success = st.session_state.gmail_sender.send_email(
-                                        contact.to_dict(), email_subject, email_content, content_type == "HTML",
-                                        st.session_state.attachments if st.session_state.attachments else None
-                                    )
-                                else:
-                                    success = False
-                                    st.error("❌ Gmail sender non configuré")
-
-                            if success:
-                                st.session_state.sending_status['success'] += 1
-                                st.session_state.send_logs.append({
-                                    'email': current_email,
-                                    'status': 'Succès',
-                                    'timestamp': time.strftime('%H:%M:%S'),
-                                    'error': ''
-                                })
-                                status_placeholder.success(f"✅ Envoyé vers: {current_email}")
-                            else:
-                                st.session_state.sending_status['errors'].append(current_email)
-                                st.session_state.send_logs.append({
-                                    'email': current_email,
-                                    'status': 'Échec',
-                                    'timestamp': time.strftime('%H:%M:%S'),
-                                    'error': 'Erreur d\'envoi'
-                                })
-                                status_placeholder.error(f"❌ Échec pour: {current_email}")
-
-                        except Exception as e:
-                            st.session_state.sending_status['errors'].append(current_email)
-                            st.session_state.send_logs.append({
-                                'email': current_email,
-                                'status': 'Erreur',
-                                'timestamp': time.strftime('%H:%M:%S'),
-                                'error': str(e)
-                            })
-                            status_placeholder.error(f"⚠️ Erreur pour {current_email}: {str(e)}")
-
-                        st.session_state.sending_status['progress'] += 1
-                        progress_percentage = st.session_state.sending_status['progress'] / st.session_state.sending_status['total']
-                        progress_bar.progress(progress_percentage)
-                        
-                        time.sleep(delay_between_emails)
+                    st.session_state.sending_status = new_send_status(len(contacts), active=True)
+
+                    # Hand the campaign to the background worker and poll its progress
+                    _get_send_worker().submit(SendJob(
+                        sender, contacts, email_subject, email_content,
+                        content_type == "HTML",
+                        st.session_state.attachments if st.session_state.attachments else None,
+                        delay_between_emails, st.session_state.sending_status, st.session_state.send_logs,
+                        max_workers=parallel_sends
+                    ))
+                    st.rerun()
 
-                    st.session_state.sending_status['active'] = False
-                    status_placeholder.success("🎉 Envoi terminé !")
+                if st.session_state.sending_status.pop('finished', False):
+                    st.success("🎉 Envoi terminé !")
                     st.balloons()  # Animation de célébration
             else:
-                if st.button("⏹️ Arrêter l'Envoi", type="secondary"):
-                    st.session_state.sending_status['active'] = False
-                    st.rerun()
+                _send_activity_panel()
         else:
             if st.session_state.send_method == "SMTP":
                 st.warning("⚠️ Veuillez compléter la configuration SMTP et charger les contacts avant de lancer l'envoi.")
@@ -707,80 +924,17 @@ def main():
                 st.warning("⚠️ Veuillez vous authentifier avec Gmail API et charger les contacts avant de lancer l'envoi.")
 
     with col4:
-        # Sending status
-        if st.session_state.sending_status['progress'] > 0:
-            st.subheader("📊 Statut d'Envoi")
-
-            progress = st.session_state.sending_status['progress']
-            total = st.session_state.sending_status['total']
-            success = st.session_state.sending_status['success']
-            errors = len(st.session_state.sending_status['errors'])
-
-            # Progress bar
-            progress_percentage = progress / total if total > 0 else 0
-            st.progress(progress_percentage)
-
-            # Stats
-            st.metric("Progression", f"{progress}/{total}")
-            st.metric("Succès", success)
-            st.metric("Erreurs", errors)
-
-            if st.session_state.sending_status['active']:
-                st.info("🔄 Envoi en cours...")
-            else:
-                if progress == total:
-                    st.success("✅ Envoi terminé!")
-                else:
-                    st.warning("⚠️ Envoi interrompu")
+        # Sending status, refreshed on its own while the background worker sends
+        sending_active = st.session_state.sending_status['active']
+        if sending_active or st.session_state.sending_status['progress'] > 0:
+            st.fragment(
+                _send_status_panel,
+                run_every=_PROGRESS_REFRESH_SECONDS if sending_active else None
+            )(sending_active)
 
     # Logs section
     if st.session_state.send_logs:
-        st.markdown("---")
-        st.header("📋 Historique des Envois")
-
-        # Convert logs to DataFrame
-        logs_df = pd.DataFrame(st.session_state.send_logs)
-
-        # Filter options
-        col5, col6 = st.columns([1, 3])
-
-        with col5:
-            status_filter = st.selectbox(
-                "Filtrer par statut",
-                ["Tous", "Succès", "Échec", "Erreur"]
-            )
-
-        # Apply filter
-        if status_filter != "Tous":
-            filtered_logs = logs_df[logs_df['status'] == status_filter]
-        else:
-            filtered_logs = logs_df
-
-        # Display logs
-        st.dataframe(
-            filtered_logs,
-            use_container_width=True,
-            column_config={
-                'email': 'Email',
-                'status': 'Statut',
-                'timestamp': 'Heure',
-                'error': 'Erreur'
-            }
-        )
-
-        # Download logs
-        csv = filtered_logs.to_csv(index=False).encode('utf-8')
-        st.download_button(
-            label="💾 Télécharger les logs",
-            data=csv,
-            file_name=f"email_logs_{time.strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
-
-        # Clear logs button
-        if st.button("🗑️ Effacer l'historique"):
-            st.session_state.send_logs = []
-            st.rerun()
+        _send_logs_panel()
 
 if __name__ == "__main__":
     main()
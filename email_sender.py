@@ -1,17 +1,162 @@
+import asyncio
 import smtplib
 import ssl
+import io
+import secrets
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
+from email.generator import BytesGenerator
 import re
 import logging
+import threading
+import time
+from collections import deque
 import pandas as pd
-from typing import Dict, Any, Tuple, List, Optional
+from utils import compile_templates, render_compiled, get_template_contacts, build_attachment_parts
+from send_worker import RateLimiter, SendJob, SendLog, new_send_status
+from typing import Dict, Any, Tuple, List, Optional, Deque, Union
+
+try:
+    import aiosmtplib
+except ImportError:  # optional; send_bulk_async falls back to the thread pool
+    aiosmtplib = None
+
+class PooledConnection:
+    """An authenticated SMTP connection checked out from a SMTPConnectionPool."""
+
+    def __init__(self, key: Tuple, server: smtplib.SMTP):
+        self.key = key
+        self.server = server
+        self.sent = 0
+        self.released_at = time.monotonic()
+        # True once it has sat idle in the pool, where the server may have dropped it
+        self.reused = False
+
+    def close(self):
+        """Close the underlying SMTP session, ignoring errors on dead sockets."""
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of authenticated SMTP connections.
+
+    Connections are keyed by the sender's server, port, credentials and
+    security mode, so every EmailSender built with the same settings reuses
+    the same sessions instead of paying TCP + TLS + AUTH for each email.
+    """
+
+    def __init__(self, max_messages: int = 100, max_idle: float = 60.0):
+        """
+        Initialize the pool.
+
+        Args:
+            max_messages: Messages sent on a connection before it is recycled
+            max_idle: Seconds an idle connection is kept before being dropped
+        """
+        self.max_messages = max_messages
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple, Deque[PooledConnection]] = {}
+        self._lock = threading.Lock()
+
+    def connect(self, sender: 'EmailSender') -> PooledConnection:
+        """
+        Open a brand new authenticated connection for a sender.
+
+        Args:
+            sender: EmailSender providing the SMTP settings
+
+        Returns:
+            PooledConnection: Freshly opened connection
+        """
+        return PooledConnection(sender.pool_key, sender._connect())
+
+    def acquire(self, sender: 'EmailSender') -> PooledConnection:
+        """
+        Check out an idle connection for a sender, opening one if needed.
+
+        Args:
+            sender: EmailSender providing the SMTP settings
+
+        Returns:
+            PooledConnection: Connection reserved for the caller
+        """
+        stale = []
+        connection = None
+        with self._lock:
+            idle = self._idle.get(sender.pool_key)
+            while idle:
+                candidate = idle.pop()
+                if time.monotonic() - candidate.released_at < self.max_idle:
+                    connection = candidate
+                    break
+                stale.append(candidate)
+
+        for candidate in stale:
+            candidate.close()
+
+        return connection if connection is not None else self.connect(sender)
+
+    def release(self, connection: PooledConnection):
+        """
+        Return a healthy connection to the pool.
+
+        Connections that reached ``max_messages`` are closed instead so the
+        next send reconnects.
+
+        Args:
+            connection: Connection previously returned by acquire()
+        """
+        if connection.sent >= self.max_messages:
+            connection.close()
+            return
+
+        connection.released_at = time.monotonic()
+        connection.reused = True
+        with self._lock:
+            self._idle.setdefault(connection.key, deque()).append(connection)
+
+    def discard(self, connection: PooledConnection):
+        """
+        Close a connection that is broken or in an unknown state.
+
+        Args:
+            connection: Connection previously returned by acquire()
+        """
+        connection.close()
+
+    def close_all(self, key: Optional[Tuple] = None):
+        """
+        Close idle connections held by the pool.
+
+        Args:
+            key: Only close the connections of this sender key (all if None)
+        """
+        with self._lock:
+            if key is None:
+                connections = [c for idle in self._idle.values() for c in idle]
+                self._idle.clear()
+            else:
+                connections = list(self._idle.pop(key, ()))
+
+        for connection in connections:
+            connection.close()
+
+# Shared by every EmailSender so preview, test and bulk sends reuse sessions
+_shared_pool = SMTPConnectionPool()
 
 class EmailSender:
+    # Compiled once at import instead of looked up in the re cache for every email
+    _EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+    # Template variables filled from the sender, identical for every contact
+    _SENDER_VARIABLES = frozenset({'sender_name', 'sender_email'})
+    
     def __init__(self, smtp_server: str, smtp_port: int, use_tls: bool, 
-                 sender_email: str, sender_password: str, sender_name: str = "", use_ssl: bool = False, reply_to_email: str = ""):
+                 sender_email: str, sender_password: str, sender_name: str = "", use_ssl: bool = False, reply_to_email: str = "",
+                 pool: Optional[SMTPConnectionPool] = None):
         """
         Initialize the EmailSender with SMTP configuration.
         
@@ -24,6 +169,7 @@ class EmailSender:
             sender_name: Display name for sender
             use_ssl: Whether to use SSL encryption (port 465)
             reply_to_email: Email address for replies (defaults to sender_email if empty)
+            pool: Connection pool to use (defaults to the module-wide shared pool)
         """
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
@@ -33,31 +179,60 @@ class EmailSender:
         self.sender_password = sender_password
         self.sender_name = sender_name
         self.reply_to_email = reply_to_email if reply_to_email else sender_email
+        self.pool = pool if pool is not None else _shared_pool
+        # Built once: loading the CA bundle is slow, and SSLContext is safe to share between threads
+        self._ssl_context = ssl.create_default_context()
+        # (templates, subject parts, content parts, variable names) of the last templates used
+        self._compiled_templates = None
+        # (attachments list, MIME parts) of the last attachments sent
+        self._prebuilt_attachments = None
+        # (attachments list, boundary, wire bytes) of the last attachments sent
+        self._serialized_attachments = None
+        # (templates and format, attachments list, wire bytes without To) of the last static message
+        self._static_message = None
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
     
+    @property
+    def pool_key(self) -> Tuple:
+        """Key identifying the SMTP sessions this sender can share."""
+        return (self.smtp_server, self.smtp_port, self.sender_email,
+                self.sender_password, self.use_ssl, self.use_tls)
+    
+    def _connect(self) -> smtplib.SMTP:
+        """
+        Open and authenticate a new SMTP connection.
+        
+        Returns:
+            smtplib.SMTP: Logged-in SMTP connection
+        """
+        context = self._ssl_context
+        
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context)
+        elif self.use_tls:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            server.starttls(context=context)
+        else:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        
+        server.login(self.sender_email, self.sender_password)
+        return server
+    
     def test_connection(self) -> bool:
         """
         Test SMTP connection with current settings.
         
+        A successful test connection is kept in the pool for the next send.
+        
         Returns:
             bool: True if connection successful, False otherwise
         """
         try:
-            context = ssl.create_default_context()
-            
-            if self.use_ssl:
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context)
-            elif self.use_tls:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-                server.starttls(context=context)
-            else:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            
-            server.login(self.sender_email, self.sender_password)
-            server.quit()
+            connection = self.pool.connect(self)
+            self.pool.release(connection)
             
             self.logger.info("SMTP connection test successful")
             return True
@@ -66,6 +241,100 @@ class EmailSender:
             self.logger.error(f"SMTP connection test failed: {str(e)}")
             return False
     
+    def open(self) -> bool:
+        """
+        Open an SMTP session ahead of a batch of sends.
+        
+        The connection is parked in the pool, where send_prepared() picks it
+        up, so the batch starts without a handshake.
+        
+        Returns:
+            bool: True if the connection was opened, False otherwise
+        """
+        try:
+            self.pool.release(self.pool.acquire(self))
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to open SMTP connection: {str(e)}")
+            return False
+    
+    def close(self):
+        """Close the idle SMTP sessions and drop the attachments cached for the batch."""
+        self.pool.close_all(self.pool_key)
+        # The sender outlives the campaign (shared via st.cache_resource); don't pin its attachments
+        self._prebuilt_attachments = None
+        self._serialized_attachments = None
+        self._static_message = None
+    
+    def __enter__(self) -> 'EmailSender':
+        self.open()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def send_prepared(self, message: Union[MIMEMultipart, bytes], recipient_email: Optional[str] = None):
+        """
+        Send an already built message over a pooled connection.
+        
+        A reused connection the server has silently dropped is replaced by a
+        fresh one and the message is retried once.
+        
+        Args:
+            message: Message returned by create_email_message(), or wire bytes
+                returned by build_message_bytes()
+            recipient_email: Envelope recipient, required when message is bytes
+            
+        Raises:
+            smtplib.SMTPException: If the message could not be sent
+        """
+        def deliver(server: smtplib.SMTP):
+            if isinstance(message, bytes):
+                server.sendmail(self.sender_email, [recipient_email], message)
+            else:
+                server.send_message(message)
+        
+        connection = self.pool.acquire(self)
+        try:
+            try:
+                deliver(connection.server)
+            except smtplib.SMTPServerDisconnected:
+                if not connection.reused:
+                    raise
+                self.pool.discard(connection)
+                # None until the new session is open: a failed reconnect leaves nothing to return
+                connection = None
+                connection = self.pool.connect(self)
+                deliver(connection.server)
+            connection.sent += 1
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+            # The server rejected this message but the session is still usable
+            if connection is not None:
+                self.pool.release(connection)
+            raise
+        except Exception:
+            # Disconnected or unknown state: drop it so the next send reconnects
+            if connection is not None:
+                self.pool.discard(connection)
+            raise
+        self.pool.release(connection)
+    
+    def compile_templates(self, subject_template: str,
+                          content_template: str) -> Tuple[List[str], List[str], frozenset]:
+        """
+        Split the subject and content templates, reusing the last result.
+        
+        Args:
+            subject_template: Email subject template with variables
+            content_template: Email content template with variables
+            
+        Returns:
+            Tuple[List[str], List[str], frozenset]: Subject parts, content parts
+            and the names of every variable they use (see utils.compile_templates)
+        """
+        self._compiled_templates = compile_templates(subject_template, content_template, self._compiled_templates)
+        return self._compiled_templates[1:]
+    
     def prepare_email_content(self, subject_template: str, content_template: str, 
                             contact: Dict[str, Any]) -> Tuple[str, str]:
         """
@@ -79,32 +348,159 @@ class EmailSender:
         Returns:
             Tuple[str, str]: Processed subject and content
         """
-        # Prepare replacement dictionary
+        subject_parts, content_parts, variables = self.compile_templates(subject_template, content_template)
+        
+        # Prepare replacement dictionary, only for the variables the templates use
         replacements = {}
         
-        # Add contact data
-        for key, value in contact.items():
-            if pd.notna(value):  # Check if value is not NaN
-                replacements[key] = str(value)
-            else:
-                replacements[key] = ""
+        # Add contact data; records from utils.contact_records are already clean strings
+        for key in variables:
+            if key in contact:
+                value = contact[key]
+                if type(value) is not str:
+                    value = str(value) if pd.notna(value) else ""
+                replacements[key] = value
         
         # Add sender information
         replacements['sender_name'] = self.sender_name
         replacements['sender_email'] = self.sender_email
         
-        # Replace variables in subject
-        processed_subject = subject_template
-        for key, value in replacements.items():
-            processed_subject = processed_subject.replace(f"{{{{{key}}}}}", value)
-        
-        # Replace variables in content
-        processed_content = content_template
-        for key, value in replacements.items():
-            processed_content = processed_content.replace(f"{{{{{key}}}}}", value)
+        # Replace variables in subject and content
+        processed_subject = render_compiled(subject_parts, replacements)
+        processed_content = render_compiled(content_parts, replacements)
         
         return processed_subject, processed_content
     
+    def prebuild_attachments(self, attachments: List[Dict[str, Any]]) -> List[MIMEBase]:
+        """
+        Build the MIME parts of a set of attachments, reusing the last result.
+        
+        Args:
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+            
+        Returns:
+            List[MIMEBase]: One base64 attachment part per attachment (see utils.build_attachment_parts)
+        """
+        self._prebuilt_attachments = build_attachment_parts(attachments, self._prebuilt_attachments)
+        return self._prebuilt_attachments[1]
+    
+    @staticmethod
+    def _to_wire_bytes(message) -> bytes:
+        """
+        Serialize a message or MIME part with CRLF line endings, as send_message() does.
+        
+        Args:
+            message: Message or MIME part to serialize
+            
+        Returns:
+            bytes: Serialized message
+        """
+        buffer = io.BytesIO()
+        BytesGenerator(buffer).flatten(message, linesep='\r\n')
+        return buffer.getvalue()
+    
+    def _serialize_attachments(self, attachments: List[Dict[str, Any]]) -> Tuple[str, bytes]:
+        """
+        Serialize the attachment parts once per attachments list.
+        
+        Args:
+            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            
+        Returns:
+            Tuple[str, bytes]: Multipart boundary of the campaign, and the
+            delimited attachment parts as sent on the wire
+        """
+        serialized = self._serialized_attachments
+        if serialized is not None and serialized[0] is attachments:
+            return serialized[1], serialized[2]
+        
+        # A run of '=' cannot occur in base64 bodies or encoded headers
+        boundary = '=' * 15 + secrets.token_hex(8) + '=='
+        delimiter = b'\r\n--' + boundary.encode('ascii') + b'\r\n'
+        chunks = []
+        for part in self.prebuild_attachments(attachments):
+            chunks.append(delimiter + self._to_wire_bytes(part))
+        
+        serialized = (attachments, boundary, b''.join(chunks))
+        self._serialized_attachments = serialized
+        return serialized[1], serialized[2]
+    
+    def build_message_bytes(self, recipient_email: str, subject: str, content: str,
+                            is_html: bool, attachments: List[Dict[str, Any]]) -> bytes:
+        """
+        Build the wire bytes of a message, splicing in pre-serialized attachments.
+        
+        Only the headers and the body are generated per recipient; the
+        attachments, the bulk of the message, are serialized once per
+        campaign. The result is what send_message() would transmit for
+        create_email_message() with the same boundary.
+        
+        Args:
+            recipient_email: Recipient's email address
+            subject: Email subject
+            content: Email content
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            
+        Returns:
+            bytes: Message ready for SMTP.sendmail()
+        """
+        message = self.create_email_message(recipient_email, subject, content, is_html)
+        return self._flatten_with_attachments(message, attachments)
+    
+    def _flatten_with_attachments(self, message: MIMEMultipart, attachments: List[Dict[str, Any]]) -> bytes:
+        """
+        Serialize a message without attachment parts, then splice them in.
+        
+        Args:
+            message: Message holding only the body part
+            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            
+        Returns:
+            bytes: Message with its attachments, as sent on the wire
+        """
+        boundary, attachment_bytes = self._serialize_attachments(attachments)
+        message.set_boundary(boundary)
+        flat = self._to_wire_bytes(message)
+        
+        # Insert the attachments before the close-delimiter
+        close_delimiter = b'\r\n--' + boundary.encode('ascii') + b'--\r\n'
+        return flat[:-len(close_delimiter)] + attachment_bytes + close_delimiter
+    
+    def build_static_message_bytes(self, subject_template: str, content_template: str,
+                                   is_html: bool, attachments: Optional[List[Dict[str, Any]]]) -> bytes:
+        """
+        Build the message shared by every recipient of a template without contact variables.
+        
+        The result has every header but To, so a recipient only costs
+        prepending its To header. It is reused while the templates, the
+        format and the attachments list stay the same.
+        
+        Args:
+            subject_template: Email subject template, using at most the sender variables
+            content_template: Email content template, using at most the sender variables
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            
+        Returns:
+            bytes: Message without its To header, ready for a recipient to be prepended
+        """
+        key = (subject_template, content_template, is_html)
+        static = self._static_message
+        if static is not None and static[0] == key and static[1] is attachments:
+            return static[2]
+        
+        subject, content = self.prepare_email_content(subject_template, content_template, {})
+        message = self.create_email_message('', subject, content, is_html)
+        del message['To']
+        if attachments:
+            flat = self._flatten_with_attachments(message, attachments)
+        else:
+            flat = self._to_wire_bytes(message)
+        
+        self._static_message = (key, attachments, flat)
+        return flat
+    
     def create_email_message(self, recipient_email: str, subject: str, 
                            content: str, is_html: bool = False, attachments: Optional[List[Dict[str, Any]]] = None) -> MIMEMultipart:
         """
@@ -115,7 +511,7 @@ class EmailSender:
             subject: Email subject
             content: Email content
             is_html: Whether content is HTML
-            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
             
         Returns:
             MIMEMultipart: Configured email message
@@ -144,17 +540,14 @@ class EmailSender:
         
         # Add attachments if provided
         if attachments:
-            for attachment in attachments:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment['content'])
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename={attachment["filename"]}')
+            for part in self.prebuild_attachments(attachments):
                 message.attach(part)
         
         return message
     
     def send_email(self, contact: Dict[str, Any], subject_template: str, 
-                   content_template: str, is_html: bool = False, attachments: Optional[List[Dict[str, Any]]] = None) -> bool:
+                   content_template: str, is_html: bool = False, attachments: Optional[List[Dict[str, Any]]] = None,
+                   recipient_email_override: Optional[str] = None) -> bool:
         """
         Send email to a single contact.
         
@@ -163,42 +556,48 @@ class EmailSender:
             subject_template: Email subject template
             content_template: Email content template
             is_html: Whether content is HTML
-            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+            recipient_email_override: Recipient address already validated by the caller; used
+                instead of contact['email'] and not checked again
             
         Returns:
             bool: True if email sent successfully, False otherwise
         """
         try:
             # Get recipient email
-            recipient_email = contact.get('email', '')
-            if not recipient_email or not self._is_valid_email(recipient_email):
-                self.logger.warning(f"Invalid email address: {recipient_email}")
-                return False
+            if recipient_email_override is not None:
+                recipient_email = recipient_email_override
+            else:
+                recipient_email = contact.get('email', '')
+                if not recipient_email or not self._is_valid_email(recipient_email):
+                    self.logger.warning(f"Invalid email address: {recipient_email}")
+                    return False
+            
+            # Send email over a pooled connection
+            variables = self.compile_templates(subject_template, content_template)[2]
+            if variables <= self._SENDER_VARIABLES and self.sender_email.isascii():
+                # Same message for every contact: it is built once, only the To header differs
+                static = self.build_static_message_bytes(subject_template, content_template, is_html, attachments)
+                self.send_prepared(b'To: ' + recipient_email.encode('ascii') + b'\r\n' + static, recipient_email)
+                self.logger.info(f"Email sent successfully to {recipient_email}")
+                return True
             
             # Prepare email content
             subject, content = self.prepare_email_content(
                 subject_template, content_template, contact
             )
             
-            # Create email message
-            message = self.create_email_message(
-                recipient_email, subject, content, is_html, attachments
-            )
-            
-            # Send email
-            context = ssl.create_default_context()
-            
-            if self.use_ssl:
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context)
-            elif self.use_tls:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-                server.starttls(context=context)
+            if attachments and self.sender_email.isascii():
+                # Attachments are serialized once for the campaign, not per email
+                self.send_prepared(
+                    self.build_message_bytes(recipient_email, subject, content, is_html, attachments),
+                    recipient_email
+                )
             else:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            
-            server.login(self.sender_email, self.sender_password)
-            server.send_message(message)
-            server.quit()
+                message = self.create_email_message(
+                    recipient_email, subject, content, is_html, attachments
+                )
+                self.send_prepared(message)
             
             self.logger.info(f"Email sent successfully to {recipient_email}")
             return True
@@ -213,7 +612,7 @@ class EmailSender:
             self.logger.error(f"SMTP server disconnected: {str(e)}")
             return False
         except Exception as e:
-            self.logger.error(f"Failed to send email to {contact.get('email', '')}: {str(e)}")
+            self.logger.error(f"Failed to send email to {recipient_email_override or contact.get('email', '')}: {str(e)}")
             return False
     
     def _is_valid_email(self, email: str) -> bool:
@@ -226,8 +625,7 @@ class EmailSender:
         Returns:
             bool: True if email is valid, False otherwise
         """
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return self._EMAIL_RE.match(email) is not None
     
     def send_bulk_emails(self, contacts_df, subject_template: str, 
                         content_template: str, is_html: bool = False, 
@@ -245,7 +643,6 @@ class EmailSender:
         Returns:
             Dict[str, Any]: Sending results summary
         """
-        import time
         import pandas as pd
         
         results = {
@@ -255,28 +652,226 @@ class EmailSender:
             'errors': []
         }
         
-        for index, contact in contacts_df.iterrows():
-            try:
-                success = self.send_email(contact, subject_template, content_template, is_html)
-                
-                if success:
-                    results['success'] += 1
-                else:
+        contacts = get_template_contacts(contacts_df, subject_template, content_template)
+        
+        # Extract and validate the addresses in one vectorized pass, aligned with contacts
+        if 'email' in contacts_df.columns:
+            email_column = contacts_df['email']
+            email_column = email_column.astype(object).where(email_column.notna(), '').astype(str)
+            emails = email_column.tolist()
+            valid = email_column.str.fullmatch(self._EMAIL_RE.pattern).tolist()
+        else:
+            emails = [''] * len(contacts)
+            valid = [False] * len(contacts)
+        
+        # Pace the sends on a monotonic schedule, so send time counts towards the delay
+        limiter = RateLimiter(1.0 / delay if delay > 0 else 0)
+        
+        # One SMTP session serves the whole batch
+        with self:
+            for contact, email, is_valid in zip(contacts, emails, valid):
+                if not is_valid:
+                    self.logger.warning(f"Invalid email address: {email}")
                     results['failed'] += 1
                     results['errors'].append({
-                        'email': contact.get('email', ''),
+                        'email': email,
                         'error': 'Failed to send email'
                     })
+                    continue
                 
-                # Add delay between emails
-                if delay > 0:
-                    time.sleep(delay)
+                limiter.acquire()
+                try:
+                    success = self.send_email(contact, subject_template, content_template, is_html,
+                                              recipient_email_override=email)
+                    
+                    if success:
+                        results['success'] += 1
+                    else:
+                        results['failed'] += 1
+                        results['errors'].append({
+                            'email': email,
+                            'error': 'Failed to send email'
+                        })
+                        
+                except Exception as e:
+                    results['failed'] += 1
+                    results['errors'].append({
+                        'email': email,
+                        'error': str(e)
+                    })
+        
+        return results
+    
+    def send_bulk_parallel(self, records: List[Dict[str, Any]], subject_template: str,
+                           content_template: str, is_html: bool = False,
+                           attachments: Optional[List[Dict[str, Any]]] = None,
+                           workers: int = 8, rate_per_sec: float = 10.0) -> Dict[str, Any]:
+        """
+        Send emails to multiple contacts over several pooled SMTP connections.
+        
+        Args:
+            records: Contact dictionaries, e.g. from get_template_contacts()
+            subject_template: Email subject template
+            content_template: Email content template
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            workers: Number of emails sent concurrently
+            rate_per_sec: Maximum emails per second across all workers (0 for no limit)
+            
+        Returns:
+            Dict[str, Any]: Sending results summary, as returned by send_bulk_emails
+        """
+        status = new_send_status(len(records), active=True)
+        logs = SendLog()
+        delay = 1.0 / rate_per_sec if rate_per_sec > 0 else 0
+        
+        SendJob(
+            self, records, subject_template, content_template, is_html, attachments,
+            delay, status, logs, max_workers=workers
+        ).run()
+        
+        history = logs.snapshot()
+        return {
+            'total': len(records),
+            'success': status['success'],
+            'failed': status['error_count'],
+            'errors': [
+                {'email': email, 'error': error}
+                for email, log_status, error in zip(history['email'], history['status'], history['error'])
+                if log_status != 'Succès'
+            ]
+        }
+    
+    async def send_bulk_async(self, records: List[Dict[str, Any]], subject_template: str,
+                              content_template: str, is_html: bool = False,
+                              attachments: Optional[List[Dict[str, Any]]] = None,
+                              concurrency: int = 16, rate_per_sec: float = 0) -> Dict[str, Any]:
+        """
+        Send emails to multiple contacts over concurrent aiosmtplib connections.
+        
+        Each of the ``concurrency`` tasks opens one SMTP session and sends the
+        records it pulls from a shared queue. A session the server drops is
+        reopened and the message retried once; a task that cannot reopen it
+        hands the contact back to the queue. Without aiosmtplib installed, the
+        send runs through send_bulk_parallel() in a worker thread.
+        
+        Args:
+            records: Contact dictionaries, e.g. from get_template_contacts()
+            subject_template: Email subject template
+            content_template: Email content template
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+            concurrency: Number of SMTP sessions used at the same time
+            rate_per_sec: Maximum emails per second across all sessions (0 for no limit)
+            
+        Returns:
+            Dict[str, Any]: Sending results summary, as returned by send_bulk_emails
+        """
+        if aiosmtplib is None:
+            return await asyncio.to_thread(
+                self.send_bulk_parallel, records, subject_template, content_template,
+                is_html, attachments, concurrency, rate_per_sec
+            )
+        
+        results = {'total': len(records), 'success': 0, 'failed': 0, 'errors': []}
+        queue: asyncio.Queue = asyncio.Queue()
+        for contact in records:
+            queue.put_nowait(contact)
+        
+        interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0
+        schedule = {'next': time.monotonic()}
+        schedule_lock = asyncio.Lock()
+        
+        async def wait_for_slot():
+            # Monotonic schedule shared by every task, one slot per email
+            if not interval:
+                return
+            async with schedule_lock:
+                now = time.monotonic()
+                slot = max(schedule['next'], now)
+                schedule['next'] = slot + interval
+            await asyncio.sleep(slot - now)
+        
+        def record_failure(email: str, error: str):
+            results['failed'] += 1
+            results['errors'].append({'email': email, 'error': error})
+        
+        async def open_session() -> 'aiosmtplib.SMTP':
+            client = aiosmtplib.SMTP(
+                hostname=self.smtp_server, port=self.smtp_port,
+                use_tls=self.use_ssl, start_tls=self.use_tls, tls_context=self._ssl_context
+            )
+            await client.connect()
+            try:
+                await client.login(self.sender_email, self.sender_password)
+            except Exception:
+                client.close()
+                raise
+            return client
+        
+        async def worker():
+            client = await open_session()
+            try:
+                while not queue.empty():
+                    contact = queue.get_nowait()
+                    recipient_email = contact.get('email', '')
+                    if not recipient_email or not self._is_valid_email(recipient_email):
+                        record_failure(recipient_email, 'Invalid email address')
+                        continue
+                    
+                    try:
+                        subject, content = self.prepare_email_content(subject_template, content_template, contact)
+                        if attachments:
+                            message = self.build_message_bytes(recipient_email, subject, content, is_html, attachments)
+                        else:
+                            message = self._to_wire_bytes(self.create_email_message(recipient_email, subject, content, is_html))
+                    except Exception as e:
+                        self.logger.error(f"Failed to build email to {recipient_email}: {str(e)}")
+                        record_failure(recipient_email, str(e))
+                        continue
                     
-            except Exception as e:
-                results['failed'] += 1
-                results['errors'].append({
-                    'email': contact.get('email', ''),
-                    'error': str(e)
-                })
+                    await wait_for_slot()
+                    error = None
+                    try:
+                        await client.sendmail(self.sender_email, [recipient_email], message)
+                    except aiosmtplib.SMTPServerDisconnected:
+                        # Dropped session (idle timeout, per-session limit): reconnect and retry
+                        # once, as send_prepared does
+                        client.close()
+                        try:
+                            client = await open_session()
+                        except Exception:
+                            # No new session: leave the contact to the other workers
+                            queue.put_nowait(contact)
+                            raise
+                        try:
+                            await client.sendmail(self.sender_email, [recipient_email], message)
+                        except Exception as e:
+                            error = e
+                    except Exception as e:
+                        error = e
+                    
+                    if error is None:
+                        results['success'] += 1
+                    else:
+                        self.logger.error(f"Failed to send email to {recipient_email}: {str(error)}")
+                        record_failure(recipient_email, str(error))
+            finally:
+                try:
+                    await client.quit()
+                except aiosmtplib.SMTPException:
+                    client.close()
+        
+        outcomes = await asyncio.gather(
+            *(worker() for _ in range(max(1, min(concurrency, len(records))))),
+            return_exceptions=True
+        )
+        
+        # A session that could not connect or log in leaves its share in the queue
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if errors:
+            self.logger.error(f"SMTP session failed: {str(errors[0])}")
+            while not queue.empty():
+                record_failure(queue.get_nowait().get('email', ''), str(errors[0]))
         
         return results
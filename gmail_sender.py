@@ -1,21 +1,182 @@
+import asyncio
 import base64
+import functools
 import json
 import os
+import re
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
-from email import encoders
+from email.header import Header
+from email.utils import formataddr
 import logging
 from typing import Dict, Any, Tuple, Optional, List
 import pandas as pd
+from utils import compile_templates, render_compiled, get_template_contacts, build_attachment_parts
+from send_worker import RateLimiter
 
 try:
     from google.auth.transport.requests import Request
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import InstalledAppFlow
-    from googleapiclient.discovery import build
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    from googleapiclient.errors import HttpError
+    from google_auth_httplib2 import AuthorizedHttp
+    import httplib2
+    import requests
 except ImportError:
-    raise ImportError("Google API libraries not installed. Please install: google-auth google-auth-oauthlib google-auth-httplib2 google-api-python-client")
+    raise ImportError("Google API libraries not installed. Please install: google-auth google-auth-oauthlib google-auth-httplib2 google-api-python-client requests")
+
+try:
+    import aiohttp
+except ImportError:  # optional; send_bulk_async falls back to the batch API in a thread
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib json module is used otherwise
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the same errors
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Configured once at import rather than on every GmailSender construction
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
+def _gmail_discovery_document() -> Dict[str, Any]:
+    """
+    Parse the Gmail API discovery document bundled with googleapiclient, once per process.
+
+    Clients built from it add the API-wide parameters to each method they
+    use; that fix-up is idempotent, so every client can share the document.
+    """
+    return _json_loads(get_static_doc('gmail', 'v1'))
+
+# Authentication error contexts, checked in order against the error message
+_ERROR_CONTEXTS = (
+    ("invalid_grant", "CODE_EXPIRED_OR_INVALID"),
+    ("Invalid authorization code", "CODE_EXPIRED_OR_INVALID"),
+    ("Scope has changed", "SCOPE_MISMATCH"),
+    ("redirect_uri_mismatch", "REDIRECT_MISMATCH"),
+    ("invalid_client", "INVALID_CREDENTIALS"),
+)
+
+@functools.lru_cache(maxsize=256)
+def _classify_error(error_str: str) -> str:
+    """
+    Map an authentication error message to its error context.
+
+    Cached, since retries and failed batches report the same messages again.
+
+    Args:
+        error_str: Error message
+
+    Returns:
+        str: Error context code, "UNKNOWN_ERROR" if no rule matches
+    """
+    for needle, context in _ERROR_CONTEXTS:
+        if needle in error_str:
+            if context == "SCOPE_MISMATCH":
+                # Check if it's just openid being added automatically by Google
+                if "openid" in error_str and "gmail.send" in error_str and "userinfo.email" in error_str:
+                    # This is a normal variation, not a real scope mismatch
+                    return "NORMAL_SCOPE_VARIATION"
+            return context
+    return "UNKNOWN_ERROR"
+
+@functools.lru_cache(maxsize=8)
+def _parse_client_config(credentials_json_content: str) -> Dict[str, Any]:
+    """
+    Parse OAuth client credentials, once per distinct credentials content.
+
+    Only the parsed configuration is shared: each auth flow keeps its own
+    state (PKCE verifier, OAuth session), so flows themselves are not cached.
+
+    Args:
+        credentials_json_content: JSON content of credentials file
+
+    Returns:
+        Dict[str, Any]: Client configuration, not to be modified
+    """
+    return _json_loads(credentials_json_content)
+
+def _email_from_id_token(id_token: Optional[str]) -> Optional[str]:
+    """
+    Read the email claim of an OpenID Connect id_token without verifying it.
+
+    Only meant for a token just received from Google's token endpoint over
+    TLS, which it is safe to trust as is.
+
+    Args:
+        id_token: JWT returned alongside the access token, if any
+
+    Returns:
+        Optional[str]: Account email, or None if the token has none
+    """
+    if not id_token:
+        return None
+    try:
+        payload = id_token.split('.')[1]
+        claims = _json_loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+    return claims.get('email') if isinstance(claims, dict) else None
+
+def _atomic_write(path: str, data: str):
+    """
+    Replace a file's content in one step, so readers never see a partial file.
+
+    Each call writes to its own temporary file next to ``path`` (same
+    filesystem, so the rename is atomic), which keeps concurrent writers
+    from clobbering each other's half-written data.
+
+    Args:
+        path: File to write
+        data: New content
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_file(tmp_path)
+        raise
+
+def _remove_file(path: str):
+    """Delete a file if it exists."""
+    if os.path.exists(path):
+        os.remove(path)
+
+# CR or LF in a header value would start a new header
+_LINE_BREAK_RE = re.compile(r'[\r\n]')
+
+# Error reasons the Gmail API reports when the token lacks a required scope
+_INSUFFICIENT_SCOPE_REASONS = frozenset({'insufficientPermissions', 'ACCESS_TOKEN_SCOPE_INSUFFICIENT'})
+
+def _is_insufficient_scope(error: HttpError) -> bool:
+    """
+    Tell whether a Gmail API error is a missing-scope (permission) error.
+
+    Args:
+        error: Error raised by a Gmail API call
+
+    Returns:
+        bool: True if the request was refused for insufficient scopes
+    """
+    if error.resp.status != 403 or not isinstance(error.error_details, list):
+        return False
+    return any(
+        isinstance(detail, dict) and detail.get('reason') in _INSUFFICIENT_SCOPE_REASONS
+        for detail in error.error_details
+    )
 
 class GmailSender:
     """Gmail API email sender class."""
@@ -27,6 +188,25 @@ class GmailSender:
         'openid'
     ]
 
+    # Most calls the Gmail API accepts in one batch HTTP request
+    MAX_BATCH_SIZE = 100
+
+    # REST endpoint of users.messages.send, called directly by send_bulk_async
+    SEND_URL = 'https://gmail.googleapis.com/gmail/v1/users/me/messages/send'
+
+    # Per-user Gmail API quota, and the cost of one messages.send call
+    QUOTA_UNITS_PER_SECOND = 250
+    SEND_QUOTA_COST = 100
+
+    # Seconds a successful connection test or send vouches for the connection
+    CONNECTION_TEST_TTL = 60.0
+
+    # Access tokens closer than this to expiry are refreshed in the background
+    TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+    # Longest header line RFC 5322 allows, excluding CRLF
+    MAX_HEADER_LINE = 998
+
     def __init__(self, credentials_json: Optional[str] = None, token_file: str = "token.json", sender_name: str = "", session_id: Optional[str] = None):
         """
         Initialize Gmail API sender.
@@ -48,16 +228,99 @@ class GmailSender:
         self.sender_name = sender_name
         self.flow = None
         self.last_auth_error = None
+        # Kept for the sender's lifetime so API calls reuse their TCP/TLS connections
+        self._http = httplib2.Http()
+        self._session = requests.Session()
+        # Background token refresh and token file I/O, run one at a time in submission order
+        self._token_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gmail-token")
+        self._refresh_future: Optional[Future] = None
+        # Keeps every send of this sender within the per-second API quota
+        self._quota = RateLimiter(self.QUOTA_UNITS_PER_SECOND, capacity=self.QUOTA_UNITS_PER_SECOND)
+        # (templates, subject parts, content parts, variable names) of the last templates used
+        self._compiled_templates = None
+        # (attachments list, MIME parts) of the last attachments sent
+        self._prebuilt_attachments = None
+        # ((sender name, sender address), From header value) of the last message built
+        self._from_header_cache = None
+        # (service, time.monotonic()) of the last successful API call
+        self._last_ok = None
+
+    def _build_service(self, creds: Credentials):
+        """
+        Build the Gmail API client on the sender's persistent HTTP connection.
+
+        The bundled discovery document is parsed once per process, so
+        building a client only binds it to the credentials: no HTTP request
+        and no JSON parsing.
+
+        Args:
+            creds: Authorized user credentials
+
+        Returns:
+            Resource: Gmail API v1 client
+        """
+        return build_from_document(_gmail_discovery_document(), http=AuthorizedHttp(creds, http=self._http))
 
-        # Setup logging
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
+    def _save_token(self, creds: Credentials):
+        """
+        Write the credentials to the token file in the background.
+
+        self.creds stays the source of truth; the file only matters to the
+        next start_auth_flow, which waits for pending writes.
+
+        Args:
+            creds: Credentials to persist
+        """
+        self._token_executor.submit(_atomic_write, self.token_file, creds.to_json())
+
+    def _remove_token(self):
+        """Delete the token file, after any write still pending."""
+        self._token_executor.submit(_remove_file, self.token_file)
+
+    def _flush_token_io(self):
+        """Wait until every queued token file write or removal is done."""
+        self._token_executor.submit(lambda: None).result()
+
+    def _refresh_credentials(self, creds: Credentials):
+        """Refresh the access token and save it, as start_auth_flow does."""
+        creds.refresh(Request(self._session))
+        # Already on the token thread, so write directly
+        _atomic_write(self.token_file, creds.to_json())
+
+    def refresh_token_if_stale(self):
+        """
+        Refresh the access token ahead of its expiry without blocking the send.
+
+        Within TOKEN_REFRESH_MARGIN of expiry the refresh starts in a
+        background thread while the still-valid token keeps being used.
+        Only a token that is no longer usable waits for the refresh.
+        """
+        creds = self.creds
+        if not creds or not creds.refresh_token or not creds.expiry:
+            return
+
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if creds.expiry - now > self.TOKEN_REFRESH_MARGIN:
+            return
+
+        future = self._refresh_future
+        if future is None or future.done():
+            future = self._token_executor.submit(self._refresh_credentials, creds)
+            self._refresh_future = future
+
+        if not creds.valid:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to refresh access token: {str(e)}")
 
     def clear_token(self):
         """Clear existing token file."""
+        self._flush_token_io()
         if os.path.exists(self.token_file):
             os.remove(self.token_file)
-            self.logger.info("Token file cleared")
+            logger.info("Token file cleared")
 
     def start_auth_flow(self, credentials_json_content: str) -> str:
         """
@@ -70,7 +333,8 @@ class GmailSender:
             str: Authorization URL to visit
         """
         try:
-            # Load existing token first
+            # Load existing token first, once pending writes have landed
+            self._flush_token_io()
             creds = None
             if os.path.exists(self.token_file):
                 creds = Credentials.from_authorized_user_file(self.token_file, self.SCOPES)
@@ -79,16 +343,15 @@ class GmailSender:
             if creds and creds.valid:
                 try:
                     self.creds = creds
-                    self.service = build('gmail', 'v1', credentials=creds)
+                    self.service = self._build_service(creds)
                     profile = self.service.users().getProfile(userId='me').execute()
                     self.sender_email = profile.get('emailAddress')
                     return "ALREADY_AUTHENTICATED"
-                except Exception as e:
-                    if "insufficientPermissions" in str(e) or "insufficient authentication scopes" in str(e):
-                        self.logger.warning("Existing token has insufficient permissions. Need to re-authenticate.")
+                except HttpError as e:
+                    if _is_insufficient_scope(e):
+                        logger.warning("Existing token has insufficient permissions. Need to re-authenticate.")
                         # Remove the invalid token file
-                        if os.path.exists(self.token_file):
-                            os.remove(self.token_file)
+                        self._remove_token()
                     else:
                         raise e
 
@@ -97,13 +360,12 @@ class GmailSender:
                 try:
                     creds.refresh(Request())
                     self.creds = creds
-                    self.service = build('gmail', 'v1', credentials=creds)
+                    self.service = self._build_service(creds)
                     profile = self.service.users().getProfile(userId='me').execute()
                     self.sender_email = profile.get('emailAddress')
 
                     # Save refreshed credentials
-                    with open(self.token_file, 'w') as token:
-                        token.write(creds.to_json())
+                    self._save_token(creds)
 
                     return "ALREADY_AUTHENTICATED"
                 except Exception:
@@ -111,7 +373,7 @@ class GmailSender:
                     pass
 
             # Need new authentication
-            credentials_data = json.loads(credentials_json_content)
+            credentials_data = _parse_client_config(credentials_json_content)
             self.flow = InstalledAppFlow.from_client_config(credentials_data, self.SCOPES)
 
             # Set redirect URI for out-of-band flow (works in Replit)
@@ -122,25 +384,12 @@ class GmailSender:
             return auth_url
 
         except Exception as e:
-            self.logger.error(f"Failed to start auth flow: {str(e)}")
+            logger.error(f"Failed to start auth flow: {str(e)}")
             return f"ERROR: {str(e)}"
 
     def get_error_context(self, error_str: str) -> str:
         """Get user-friendly error context based on the error string."""
-        if "invalid_grant" in error_str or "Invalid authorization code" in error_str:
-            return "CODE_EXPIRED_OR_INVALID"
-        elif "Scope has changed" in error_str:
-            # Check if it's just openid being added automatically by Google
-            if "openid" in error_str and "gmail.send" in error_str and "userinfo.email" in error_str:
-                # This is a normal variation, not a real scope mismatch
-                return "NORMAL_SCOPE_VARIATION"
-            return "SCOPE_MISMATCH"
-        elif "redirect_uri_mismatch" in error_str:
-            return "REDIRECT_MISMATCH"
-        elif "invalid_client" in error_str:
-            return "INVALID_CREDENTIALS"
-        else:
-            return "UNKNOWN_ERROR"
+        return _classify_error(error_str)
 
     def complete_authentication(self, auth_code: str) -> bool:
         """
@@ -154,7 +403,7 @@ class GmailSender:
         """
         try:
             if not self.flow:
-                self.logger.error("No authentication flow available")
+                logger.error("No authentication flow available")
                 return False
 
             # Exchange code for credentials
@@ -162,95 +411,84 @@ class GmailSender:
             creds = self.flow.credentials
 
             # Save the credentials for future use
-            with open(self.token_file, 'w') as token:
-                token.write(creds.to_json())
+            self._save_token(creds)
 
             # Set up service
             self.creds = creds
-            self.service = build('gmail', 'v1', credentials=creds)
+            self.service = self._build_service(creds)
 
             # Get user email - try multiple methods
-            try:
-                # Method 1: Try Gmail profile
-                profile = self.service.users().getProfile(userId='me').execute()
-                self.sender_email = profile.get('emailAddress')
-            except Exception as profile_error:
-                self.logger.warning(f"Could not get Gmail profile: {profile_error}")
+            # Method 1: Read it from the OpenID id_token that came with the access token
+            self.sender_email = _email_from_id_token(creds.id_token)
+            if self.sender_email:
+                logger.info(f"Got email from id_token: {self.sender_email}")
+            else:
                 try:
-                    # Method 2: Try getting from token info
-                    import requests
-                    token_info_url = f"https://www.googleapis.com/oauth2/v1/tokeninfo?access_token={creds.token}"
-                    response = requests.get(token_info_url)
-                    if response.status_code == 200:
-                        token_info = response.json()
-                        self.sender_email = token_info.get('email')
-                        if self.sender_email:
-                            self.logger.info(f"Got email from token info: {self.sender_email}")
-                    else:
-                        self.logger.warning("Could not get email from token info")
-                        # Fallback: will be set when sending first email
-                        self.sender_email = "authenticated@gmail.com"
-                        self.logger.info("Using fallback email, will be updated when sending")
-                except Exception as token_error:
-                    self.logger.warning(f"Could not get email from token: {token_error}")
+                    # Method 2: Try Gmail profile
+                    profile = self.service.users().getProfile(userId='me').execute()
+                    self.sender_email = profile.get('emailAddress')
+                except Exception as profile_error:
+                    logger.warning(f"Could not get Gmail profile: {profile_error}")
+                    # Fallback: will be set when sending first email
                     self.sender_email = "authenticated@gmail.com"
+                    logger.info("Using fallback email, will be updated when sending")
 
-            self.logger.info("Gmail API authentication completed successfully")
+            logger.info("Gmail API authentication completed successfully")
             return True
 
         except Exception as e:
             error_str = str(e)
-            self.logger.error(f"Failed to complete authentication: {error_str}")
+            logger.error(f"Failed to complete authentication: {error_str}")
             
-            # Handle scope changes that are normal OAuth behavior
-            if "Scope has changed" in error_str:
+            # Handle scope changes that are normal OAuth behavior; oauthlib raises them
+            # as a Warning carrying the granted scopes
+            if isinstance(e, Warning) and hasattr(e, 'new_scope'):
+                # Check what scopes were actually granted
+                granted_scopes = " ".join(e.new_scope or [])
+                logger.error(f"Permissions accordées par l'utilisateur: {granted_scopes}")
+                
+                if "gmail.send" not in granted_scopes:
+                    logger.error("ERREUR: L'utilisateur n'a pas accordé la permission d'envoi Gmail")
+                    self.last_auth_error = "MISSING_GMAIL_SEND"
+                    return False
+                
                 # Check if the scopes contain the essential ones we need
                 required_scopes = ["gmail.send", "userinfo.email"]
-                has_required = all(scope in error_str for scope in required_scopes)
-                
-                # Check what scopes were actually granted
-                if "to \"" in error_str:
-                    granted_scopes = error_str.split("to \"")[1].split("\"")[0]
-                    self.logger.error(f"Permissions accordées par l'utilisateur: {granted_scopes}")
-                    
-                    if "gmail.send" not in granted_scopes:
-                        self.logger.error("ERREUR: L'utilisateur n'a pas accordé la permission d'envoi Gmail")
-                        self.last_auth_error = "MISSING_GMAIL_SEND"
-                        return False
+                has_required = all(scope in granted_scopes for scope in required_scopes)
                 
                 if has_required and self.flow:
                     # This is just Google adding/reordering scopes automatically, try to proceed anyway
-                    self.logger.info("Detected normal OAuth scope variation, attempting to continue...")
+                    logger.info("Detected normal OAuth scope variation, attempting to continue...")
                     try:
                         # Clear existing token and try fresh authentication
-                        if os.path.exists(self.token_file):
-                            os.remove(self.token_file)
+                        self._remove_token()
                         
                         # Re-run the flow with current code
                         self.flow.fetch_token(code=auth_code.strip())
                         creds = self.flow.credentials
                         
                         # Save and test the credentials
-                        with open(self.token_file, 'w') as token:
-                            token.write(creds.to_json())
+                        self._save_token(creds)
                         
                         self.creds = creds
-                        self.service = build('gmail', 'v1', credentials=creds)
+                        self.service = self._build_service(creds)
                         
                         # Get user email - try multiple methods
-                        try:
-                            profile = self.service.users().getProfile(userId='me').execute()
-                            self.sender_email = profile.get('emailAddress')
-                        except Exception:
-                            # Fallback method for email
-                            self.sender_email = "authenticated@gmail.com"
-                            self.logger.info("Using fallback email, will be updated when sending")
+                        self.sender_email = _email_from_id_token(creds.id_token)
+                        if not self.sender_email:
+                            try:
+                                profile = self.service.users().getProfile(userId='me').execute()
+                                self.sender_email = profile.get('emailAddress')
+                            except Exception:
+                                # Fallback method for email
+                                self.sender_email = "authenticated@gmail.com"
+                                logger.info("Using fallback email, will be updated when sending")
                         
-                        self.logger.info("Gmail API authentication completed successfully after scope adjustment")
+                        logger.info("Gmail API authentication completed successfully after scope adjustment")
                         return True
                         
                     except Exception as retry_error:
-                        self.logger.error(f"Retry failed: {str(retry_error)}")
+                        logger.error(f"Retry failed: {str(retry_error)}")
                         # Fall through to normal error handling
                         pass
             
@@ -258,73 +496,101 @@ class GmailSender:
             error_context = self.get_error_context(error_str)
             
             if error_context == "CODE_EXPIRED_OR_INVALID":
-                self.logger.warning("Authorization code is invalid or expired")
+                logger.warning("Authorization code is invalid or expired")
             elif error_context == "SCOPE_MISMATCH":
-                self.logger.warning("Scope mismatch detected, clearing existing token")
-                if os.path.exists(self.token_file):
-                    os.remove(self.token_file)
+                logger.warning("Scope mismatch detected, clearing existing token")
+                self._remove_token()
                 self.flow = None
-                self.logger.info("Please generate a new authorization link and try again")
+                logger.info("Please generate a new authorization link and try again")
             elif error_context == "REDIRECT_MISMATCH":
-                self.logger.error("Redirect URI mismatch. Please check your Google Console configuration")
+                logger.error("Redirect URI mismatch. Please check your Google Console configuration")
             elif error_context == "INVALID_CREDENTIALS":
-                self.logger.error("Invalid client credentials. Please verify your credentials.json file")
+                logger.error("Invalid client credentials. Please verify your credentials.json file")
             else:
-                self.logger.error("Unknown authentication error occurred")
+                logger.error("Unknown authentication error occurred")
             
             # Store error context for UI display
             self.last_auth_error = error_context
             
             return False
 
+    def _mark_connection_ok(self):
+        """Record that the current service just completed an API call."""
+        self._last_ok = (self.service, time.monotonic())
+
     def test_connection(self) -> bool:
         """
         Test Gmail API connection.
 
+        A successful test or send within CONNECTION_TEST_TTL seconds, on the
+        same service, answers without calling the API again.
+
         Returns:
             bool: True if connection successful
         """
         try:
             if not self.service:
-                self.logger.error("Gmail service not initialized")
+                logger.error("Gmail service not initialized")
                 return False
 
+            # A recent successful call on this service already proves the connection
+            last_ok = self._last_ok
+            if last_ok and last_ok[0] is self.service and time.monotonic() - last_ok[1] < self.CONNECTION_TEST_TTL:
+                return True
+
             # Test basic Gmail API access with a simple call
             try:
                 # Try to list labels as a lightweight test
                 labels_result = self.service.users().labels().list(userId='me').execute()
                 if labels_result:
-                    self.logger.info("Gmail API connection test successful")
+                    logger.info("Gmail API connection test successful")
+                    self._mark_connection_ok()
                     
                     # Try to get email if we don't have it
                     if not self.sender_email or self.sender_email == "authenticated@gmail.com":
                         try:
                             profile = self.service.users().getProfile(userId='me').execute()
                             self.sender_email = profile.get('emailAddress')
-                            self.logger.info(f"Updated sender email: {self.sender_email}")
+                            logger.info(f"Updated sender email: {self.sender_email}")
                         except Exception:
-                            self.logger.info("Email will be updated when sending first message")
+                            logger.info("Email will be updated when sending first message")
                     
                     return True
                 else:
                     return False
                     
-            except Exception as api_error:
-                if "insufficientPermissions" in str(api_error):
+            except HttpError as api_error:
+                if _is_insufficient_scope(api_error):
                     # Try a more basic test - just check if service responds
-                    self.logger.warning("Limited permissions, but service is accessible")
+                    logger.warning("Limited permissions, but service is accessible")
                     return True
                 else:
                     raise api_error
 
         except Exception as e:
-            self.logger.error(f"Gmail API connection test failed: {str(e)}")
+            logger.error(f"Gmail API connection test failed: {str(e)}")
             # Log more details about the error
-            if "insufficientPermissions" in str(e) or "insufficient authentication scopes" in str(e):
-                self.logger.error("Permission error detected. Make sure your credentials have the required scopes:")
-                self.logger.error(f"Required scopes: {self.SCOPES}")
+            if isinstance(e, HttpError) and _is_insufficient_scope(e):
+                logger.error("Permission error detected. Make sure your credentials have the required scopes:")
+                logger.error(f"Required scopes: {self.SCOPES}")
             return False
 
+    def compile_templates(self, subject_template: str,
+                          content_template: str) -> Tuple[List[str], List[str], frozenset]:
+        """
+        Split the subject and content templates, reusing the last result.
+
+        Args:
+            subject_template: Email subject template with variables
+            content_template: Email content template with variables
+
+        Returns:
+            Tuple[List[str], List[str], frozenset]: Subject parts, content parts
+            and the names of every variable they use (see utils.compile_templates)
+        """
+        self._compiled_templates = compile_templates(subject_template, content_template, self._compiled_templates)
+        return self._compiled_templates[1:]
+
     def prepare_email_content(self, subject_template: str, content_template: str, 
                             contact: Dict[str, Any]) -> Tuple[str, str]:
         """
@@ -338,31 +604,93 @@ class GmailSender:
         Returns:
             Tuple[str, str]: Processed subject and content
         """
-        # Prepare replacement dictionary
+        subject_parts, content_parts, variables = self.compile_templates(subject_template, content_template)
+
+        # Prepare replacement dictionary, only for the variables the templates use
         replacements = {}
 
-        # Add contact data
-        for key, value in contact.items():
-            if pd.notna(value):  # Check if value is not NaN
-                replacements[key] = str(value)
-            else:
-                replacements[key] = ""
+        # Add contact data; records from utils.contact_records are already clean strings
+        for key in variables:
+            if key in contact:
+                value = contact[key]
+                if type(value) is not str:
+                    value = str(value) if pd.notna(value) else ""
+                replacements[key] = value
 
         # Add sender information
         replacements['sender_email'] = self.sender_email or ""
 
-        # Replace variables in subject
-        processed_subject = subject_template
-        for key, value in replacements.items():
-            processed_subject = processed_subject.replace(f"{{{{{key}}}}}", value)
-
-        # Replace variables in content
-        processed_content = content_template
-        for key, value in replacements.items():
-            processed_content = processed_content.replace(f"{{{{{key}}}}}", value)
+        # Replace variables in subject and content
+        processed_subject = render_compiled(subject_parts, replacements)
+        processed_content = render_compiled(content_parts, replacements)
 
         return processed_subject, processed_content
 
+    def prebuild_attachments(self, attachments: List[Dict[str, Any]]) -> List[MIMEBase]:
+        """
+        Build the MIME parts of a set of attachments, reusing the last result.
+
+        Args:
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+
+        Returns:
+            List[MIMEBase]: One base64 attachment part per attachment (see utils.build_attachment_parts)
+        """
+        self._prebuilt_attachments = build_attachment_parts(attachments, self._prebuilt_attachments)
+        return self._prebuilt_attachments[1]
+
+    def _from_header(self) -> str:
+        """Format the From header once per sender name and address."""
+        key = (self.sender_name, self.sender_email)
+        cached = self._from_header_cache
+        if cached is None or cached[0] != key:
+            if self.sender_name:
+                value = formataddr((self.sender_name, self.sender_email or ""))
+            else:
+                value = self.sender_email or ""
+            cached = (key, value)
+            self._from_header_cache = cached
+        return cached[1]
+
+    def _plain_text_bytes(self, to: str, subject: str, message_text: str) -> bytes:
+        """
+        Build a plain-text message without attachments directly as RFC 5322 bytes.
+
+        This is the common case of a bulk send, and skips building MIME
+        objects and running the email generator for every recipient. The
+        subject is folded like the MIME path does; a non-ASCII subject, or
+        one without a place to fold it, goes through RFC 2047 encoding.
+
+        Args:
+            to: Email address of the receiver, ASCII without line breaks
+            subject: The subject of the email message, without line breaks
+            message_text: The text of the email message
+
+        Returns:
+            bytes: Complete message with a base64 UTF-8 body
+        """
+        folded = None
+        if subject.isascii():
+            folded = Header(subject, header_name='Subject').encode(linesep='\r\n', maxlinelen=78)
+            # A long run without whitespace cannot be folded as plain text
+            if any(len(line) > self.MAX_HEADER_LINE for line in folded.split('\r\n')):
+                folded = None
+        if folded is None:
+            folded = Header(subject, 'utf-8', header_name='Subject').encode(linesep='\r\n', maxlinelen=78)
+        subject = folded
+
+        headers = (
+            f"To: {to}\r\n"
+            f"From: {self._from_header()}\r\n"
+            f"Subject: {subject}\r\n"
+            "MIME-Version: 1.0\r\n"
+            "Content-Type: text/plain; charset=\"utf-8\"\r\n"
+            "Content-Transfer-Encoding: base64\r\n"
+            "\r\n"
+        )
+        body = base64.encodebytes(message_text.encode('utf-8')).replace(b'\n', b'\r\n')
+        return headers.encode('ascii') + body
+
     def create_message(self, to: str, subject: str, message_text: str, is_html: bool = False, attachments: Optional[List[Dict[str, Any]]] = None) -> Dict:
         """
         Create a message for an email.
@@ -372,11 +700,16 @@ class GmailSender:
             subject: The subject of the email message
             message_text: The text of the email message
             is_html: Whether the message is HTML
-            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
 
         Returns:
             Dict: An object containing a base64url encoded email object
         """
+        # Line breaks in the headers go through the MIME path, which rejects them
+        plain_headers = to.isascii() and (self.sender_email or "").isascii() and not _LINE_BREAK_RE.search(to + subject)
+        if not is_html and not attachments and plain_headers:
+            return {'raw': base64.urlsafe_b64encode(self._plain_text_bytes(to, subject, message_text)).decode('ascii')}
+
         if is_html or attachments:
             message = MIMEMultipart('mixed')
             if is_html:
@@ -396,14 +729,10 @@ class GmailSender:
 
         # Add attachments if provided
         if attachments:
-            for attachment in attachments:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment['content'])
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename={attachment["filename"]}')
+            for part in self.prebuild_attachments(attachments):
                 message.attach(part)
 
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('ascii')
         return {'raw': raw_message}
 
     def send_message(self, message: Dict) -> bool:
@@ -418,14 +747,17 @@ class GmailSender:
         """
         try:
             if not self.service:
-                self.logger.error("Gmail service not initialized")
+                logger.error("Gmail service not initialized")
                 return False
                 
+            self.refresh_token_if_stale()
+            self._quota.acquire(self.SEND_QUOTA_COST)
             message = self.service.users().messages().send(userId="me", body=message).execute()
-            self.logger.info(f'Message Id: {message["id"]}')
+            logger.info(f'Message Id: {message["id"]}')
+            self._mark_connection_ok()
             return True
         except Exception as e:
-            self.logger.error(f'An error occurred: {e}')
+            logger.error(f'An error occurred: {e}')
             return False
 
     def send_email(self, contact: Dict[str, Any], subject_template: str, 
@@ -438,20 +770,20 @@ class GmailSender:
             subject_template: Email subject template
             content_template: Email content template
             is_html: Whether content is HTML
-            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
 
         Returns:
             bool: True if email sent successfully
         """
         try:
             if not self.service:
-                self.logger.error("Gmail API not authenticated")
+                logger.error("Gmail API not authenticated")
                 return False
 
             # Get recipient email
             recipient_email = contact.get('email', '')
             if not recipient_email:
-                self.logger.warning(f"No email address found for contact")
+                logger.warning(f"No email address found for contact")
                 return False
 
             # Prepare email content
@@ -466,12 +798,225 @@ class GmailSender:
             success = self.send_message(message)
 
             if success:
-                self.logger.info(f"Email sent successfully to {recipient_email}")
+                logger.info(f"Email sent successfully to {recipient_email}")
             else:
-                self.logger.error(f"Failed to send email to {recipient_email}")
+                logger.error(f"Failed to send email to {recipient_email}")
 
             return success
 
         except Exception as e:
-            self.logger.error(f"Failed to send email to {contact.get('email', '')}: {str(e)}")
-            return False
\ No newline at end of file
+            logger.error(f"Failed to send email to {contact.get('email', '')}: {str(e)}")
+            return False
+
+    def send_bulk_emails(self, contacts_df, subject_template: str, content_template: str,
+                         is_html: bool = False, attachments: Optional[List[Dict[str, Any]]] = None,
+                         batch_size: int = MAX_BATCH_SIZE) -> Dict[str, Any]:
+        """
+        Send emails to multiple contacts, grouping the API calls into batch HTTP requests.
+
+        Each batch carries up to ``batch_size`` messages().send calls in one
+        round-trip instead of one request per contact. The quota is paid per
+        call as it is added, so a full batch is only executed once the bucket
+        has refilled for all of its sends: batches are spread over time and
+        the per-second average stays within the Gmail quota, whose moving
+        average tolerates the short burst of one batch.
+
+        Args:
+            contacts_df: DataFrame containing contact information
+            subject_template: Email subject template
+            content_template: Email content template
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+            batch_size: Number of messages per batch request (at most MAX_BATCH_SIZE)
+
+        Returns:
+            Dict[str, Any]: Sending results summary
+        """
+        results = {
+            'total': len(contacts_df),
+            'success': 0,
+            'failed': 0,
+            'errors': []
+        }
+
+        def record_failure(email: str, error: str):
+            results['failed'] += 1
+            results['errors'].append({'email': email, 'error': error})
+
+        if not self.service:
+            logger.error("Gmail API not authenticated")
+            for contact in get_template_contacts(contacts_df, subject_template, content_template):
+                record_failure(contact.get('email', ''), 'Gmail API not authenticated')
+            return results
+
+        batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        contacts = get_template_contacts(contacts_df, subject_template, content_template)
+
+        for start in range(0, len(contacts), batch_size):
+            # Recipients by request id, removed once the API answers for them
+            pending: Dict[str, str] = {}
+
+            def on_response(request_id: str, response: Optional[Dict], exception: Optional[Exception]):
+                recipient_email = pending.pop(request_id)
+                if exception is not None:
+                    logger.error(f"Failed to send email to {recipient_email}: {exception}")
+                    record_failure(recipient_email, str(exception))
+                else:
+                    logger.info(f"Email sent successfully to {recipient_email}")
+                    results['success'] += 1
+                    self._mark_connection_ok()
+
+            self.refresh_token_if_stale()
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for contact in contacts[start:start + batch_size]:
+                recipient_email = contact.get('email', '')
+                if not recipient_email:
+                    logger.warning("No email address found for contact")
+                    record_failure(recipient_email, 'No email address')
+                    continue
+
+                try:
+                    subject, content = self.prepare_email_content(subject_template, content_template, contact)
+                    message = self.create_message(recipient_email, subject, content, is_html, attachments)
+                except Exception as e:
+                    record_failure(recipient_email, str(e))
+                    continue
+
+                # One send at a time: a whole batch costs more than the bucket holds
+                self._quota.acquire(self.SEND_QUOTA_COST)
+                request_id = str(len(pending))
+                pending[request_id] = recipient_email
+                batch.add(self.service.users().messages().send(userId="me", body=message), request_id=request_id)
+
+            if not pending:
+                continue
+
+            try:
+                batch.execute()
+            except Exception as e:
+                # The messages the API did not answer for were not sent
+                logger.error(f"Batch request failed: {str(e)}")
+                for recipient_email in pending.values():
+                    record_failure(recipient_email, str(e))
+
+        return results
+
+    async def send_message_async(self, session: 'aiohttp.ClientSession', message: Dict) -> Optional[str]:
+        """
+        Send an email message with a direct HTTP call to the Gmail REST API.
+
+        Args:
+            session: HTTP session the request is sent on
+            message: Message created by create_message()
+
+        Returns:
+            Optional[str]: None if the message was sent, the error otherwise
+        """
+        headers = {'Authorization': f'Bearer {self.creds.token}'}
+        if orjson is not None:
+            request = session.post(self.SEND_URL, data=orjson.dumps(message),
+                                   headers={**headers, 'Content-Type': 'application/json'})
+        else:
+            request = session.post(self.SEND_URL, json=message, headers=headers)
+        async with request as response:
+            if response.status == 200:
+                return None
+            return f"HTTP {response.status}: {await response.text()}"
+
+    async def send_bulk_async(self, records: List[Dict[str, Any]], subject_template: str,
+                              content_template: str, is_html: bool = False,
+                              attachments: Optional[List[Dict[str, Any]]] = None,
+                              concurrency: int = 16) -> Dict[str, Any]:
+        """
+        Send emails to multiple contacts with concurrent aiohttp requests.
+
+        ``concurrency`` tasks pull contacts from a shared queue and send them
+        on one shared session, each building its message only when its quota
+        slot comes up. Without aiohttp installed, the send runs through
+        send_bulk_emails() and its batch requests in a worker thread.
+
+        Args:
+            records: Contact dictionaries, e.g. from get_template_contacts()
+            subject_template: Email subject template
+            content_template: Email content template
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+            concurrency: Number of requests sent at the same time
+
+        Returns:
+            Dict[str, Any]: Sending results summary, as returned by send_bulk_emails
+        """
+        if aiohttp is None:
+            return await asyncio.to_thread(
+                self.send_bulk_emails, pd.DataFrame(records), subject_template, content_template,
+                is_html, attachments
+            )
+
+        results = {'total': len(records), 'success': 0, 'failed': 0, 'errors': []}
+
+        def record_failure(email: str, error: str):
+            results['failed'] += 1
+            results['errors'].append({'email': email, 'error': error})
+
+        if not self.service or not self.creds:
+            logger.error("Gmail API not authenticated")
+            for contact in records:
+                record_failure(contact.get('email', ''), 'Gmail API not authenticated')
+            return results
+
+        # Requests read the current access token, which is kept fresh in the background
+        await asyncio.to_thread(self.refresh_token_if_stale)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for contact in records:
+            queue.put_nowait(contact)
+
+        # Same pace as the shared quota bucket the other send paths draw from
+        interval = self.SEND_QUOTA_COST / self._quota.rate if self._quota.rate > 0 else 0
+        schedule = {'next': time.monotonic()}
+
+        async def wait_for_quota():
+            # Monotonic schedule shared by every task, one slot per messages.send call
+            now = time.monotonic()
+            slot = max(schedule['next'], now)
+            schedule['next'] = slot + interval
+            await asyncio.sleep(slot - now)
+
+        async def worker(session: 'aiohttp.ClientSession'):
+            while not queue.empty():
+                contact = queue.get_nowait()
+                recipient_email = contact.get('email', '')
+                if not recipient_email:
+                    record_failure(recipient_email, 'No email address')
+                    continue
+
+                # Built only once its slot is due, so at most one message per worker is held
+                await wait_for_quota()
+                try:
+                    subject, content = self.prepare_email_content(subject_template, content_template, contact)
+                    message = self.create_message(recipient_email, subject, content, is_html, attachments)
+                except Exception as e:
+                    record_failure(recipient_email, str(e))
+                    continue
+
+                # A due refresh blocks on the token executor; keep it off the event loop
+                await asyncio.to_thread(self.refresh_token_if_stale)
+                try:
+                    error = await self.send_message_async(session, message)
+                except aiohttp.ClientError as e:
+                    error = str(e)
+
+                if error is None:
+                    logger.info(f"Email sent successfully to {recipient_email}")
+                    results['success'] += 1
+                    self._mark_connection_ok()
+                else:
+                    logger.error(f"Failed to send email to {recipient_email}: {error}")
+                    record_failure(recipient_email, error)
+
+        workers = max(1, min(concurrency, len(records)))
+        connector = aiohttp.TCPConnector(limit=workers)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(*(worker(session) for _ in range(workers)))
+
+        return results
@@ -0,0 +1,264 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
+
+# Failed addresses kept in the status for display; the send log has all of them
+RECENT_ERRORS_LIMIT = 1000
+
+def new_send_status(total: int = 0, active: bool = False) -> Dict[str, Any]:
+    """
+    Create the status dictionary a SendJob updates while it runs.
+
+    Args:
+        total: Number of emails in the job
+        active: Whether the job is starting now
+
+    Returns:
+        Dict[str, Any]: Status with progress counters and the latest failed addresses
+    """
+    return {
+        'active': active,
+        'progress': 0,
+        'total': total,
+        'success': 0,
+        'error_count': 0,
+        'recent_errors': deque(maxlen=RECENT_ERRORS_LIMIT)
+    }
+
+class RateLimiter:
+    """Thread-safe token bucket capping how many emails a job sends per second."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Initialize the token bucket.
+
+        Args:
+            rate: Tokens added per second (0 disables limiting)
+            capacity: Maximum number of tokens, i.e. the allowed burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float = 1.0):
+        """
+        Block until enough tokens are available, then consume them.
+
+        Args:
+            cost: Tokens taken by the call, at most the bucket capacity
+        """
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return
+                wait = (cost - self._tokens) / self.rate
+            time.sleep(wait)
+
+class SendLog:
+    """Thread-safe send history stored as one list per column."""
+
+    COLUMNS = ('email', 'status', 'timestamp', 'error')
+
+    # Shared by every log so a version never repeats, even across sessions
+    _versions = itertools.count(1)
+
+    def __init__(self):
+        """Initialize an empty history."""
+        self._columns: Dict[str, List[str]] = {name: [] for name in self.COLUMNS}
+        self._lock = threading.Lock()
+        # Changes on every append or clear; usable as a cache key for the content
+        self.version = next(self._versions)
+
+    def __len__(self) -> int:
+        return len(self._columns['email'])
+
+    def append(self, email: str, status: str, timestamp: str, error: str):
+        """
+        Record the outcome of one email.
+
+        Args:
+            email: Recipient address
+            status: 'Succès', 'Échec' or 'Erreur'
+            timestamp: Time of the attempt, formatted as HH:MM:SS
+            error: Error message, empty on success
+        """
+        with self._lock:
+            columns = self._columns
+            columns['email'].append(email)
+            columns['status'].append(status)
+            columns['timestamp'].append(timestamp)
+            columns['error'].append(error)
+            self.version = next(self._versions)
+
+    def clear(self):
+        """Drop every recorded entry."""
+        with self._lock:
+            for values in self._columns.values():
+                values.clear()
+            self.version = next(self._versions)
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """
+        Copy the columns, consistent even while a job is still appending.
+
+        Returns:
+            Dict[str, List[str]]: Column name to values, ready for pd.DataFrame
+        """
+        return self.versioned_snapshot()[1]
+
+    def versioned_snapshot(self) -> Tuple[int, Dict[str, List[str]]]:
+        """
+        Copy the columns together with the version they were copied at.
+
+        Returns:
+            Tuple[int, Dict[str, List[str]]]: Version and column name to values
+        """
+        with self._lock:
+            return self.version, {name: values.copy() for name, values in self._columns.items()}
+
+class SendJob:
+    """A bulk send campaign processed in the background by a SendWorker."""
+
+    def __init__(self, sender, contacts: List[Dict[str, Any]], subject_template: str, content_template: str,
+                 is_html: bool, attachments: Optional[List[Dict[str, Any]]], delay: float,
+                 status: Dict[str, Any], logs: SendLog, max_workers: int = 1):
+        """
+        Initialize a send job.
+
+        Args:
+            sender: EmailSender or GmailSender used to deliver the emails
+            contacts: Contact dictionaries, already narrowed to the template columns
+            subject_template: Email subject template
+            content_template: Email content template
+            is_html: Whether content is HTML
+            attachments: List of attachment dictionaries with 'filename' and 'content' keys
+            delay: Delay between emails in seconds, enforced across all workers
+            status: Shared sending status from new_send_status(), updated in place
+            logs: Shared send history, appended to in place
+            max_workers: Number of emails sent concurrently (the sender must be thread-safe if > 1)
+        """
+        self.sender = sender
+        self.contacts = contacts
+        self.subject_template = subject_template
+        self.content_template = content_template
+        self.is_html = is_html
+        self.attachments = attachments
+        self.status = status
+        self.logs = logs
+        self.max_workers = max(1, max_workers)
+        self.limiter = RateLimiter(1.0 / delay if delay > 0 else 0)
+        self.lock = threading.Lock()
+
+    def _record(self, email: str, status: str, error: str, event: str, message: str):
+        """Append a log entry and publish the latest event for the UI."""
+        with self.lock:
+            self.logs.append(email, status, time.strftime('%H:%M:%S'), error)
+            if status == 'Succès':
+                self.status['success'] += 1
+            else:
+                self.status['error_count'] += 1
+                self.status['recent_errors'].append(email)
+            self.status['progress'] += 1
+            self.status['last_event'] = (event, message)
+
+    def _send_one(self, contact: Dict[str, Any]) -> Optional[Tuple[str, str, str, str, str]]:
+        """
+        Send one email once the rate limiter allows it.
+
+        Args:
+            contact: Contact information dictionary
+
+        Returns:
+            Optional[Tuple[str, str, str, str, str]]: Arguments for _record, or None if cancelled
+        """
+        self.limiter.acquire()
+        if not self.status['active']:
+            return None
+
+        current_email = contact.get('email', '')
+        self.status['last_event'] = ('info', f"📧 Envoi vers: {current_email}")
+
+        try:
+            success = self.sender.send_email(
+                contact, self.subject_template, self.content_template,
+                self.is_html, self.attachments
+            )
+
+            if success:
+                return current_email, 'Succès', '', 'success', f"✅ Envoyé vers: {current_email}"
+            return current_email, 'Échec', 'Erreur d\'envoi', 'error', f"❌ Échec pour: {current_email}"
+
+        except Exception as e:
+            return current_email, 'Erreur', str(e), 'error', f"⚠️ Erreur pour {current_email}: {str(e)}"
+
+    def run(self):
+        """Send every email of the job, stopping early if the job is cancelled."""
+        # EmailSender keeps its SMTP session open for the whole job and closes it afterwards
+        session = self.sender if hasattr(self.sender, '__enter__') else nullcontext()
+        with session, ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="send-job") as executor:
+            futures = [
+                executor.submit(self._send_one, contact)
+                for contact in self.contacts
+            ]
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                result = future.result()
+                if result is not None:
+                    self._record(*result)
+
+                if not self.status['active']:
+                    # Drop everything still queued; sends in flight finish normally
+                    for pending in futures:
+                        pending.cancel()
+
+        self.status['active'] = False
+        self.status['finished'] = True
+
+class SendWorker:
+    """Daemon thread running queued SendJob instances one after another."""
+
+    def __init__(self):
+        """Initialize the job queue and start the worker thread."""
+        self.logger = logging.getLogger(__name__)
+        self._queue: "queue.Queue[SendJob]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="send-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, job: SendJob):
+        """
+        Queue a job for background sending.
+
+        Args:
+            job: Job to run once the jobs queued before it are done
+        """
+        self._queue.put(job)
+
+    def _run(self):
+        """Process jobs forever."""
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            except Exception as e:
+                self.logger.error(f"Send job failed: {str(e)}")
+                job.status['active'] = False
+                job.status['finished'] = True
+            finally:
+                self._queue.task_done()
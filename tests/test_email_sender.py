@@ -0,0 +1,145 @@
+import asyncio
+import smtplib
+import unittest
+from unittest import mock
+
+import email_sender
+
+
+class FakeAsyncSMTP:
+    """aiosmtplib.SMTP stand-in whose sessions the server drops after ``limit`` messages."""
+
+    limit = 2
+    refuse_logins_after = None
+    sessions = []
+    sent = []
+
+    def __init__(self, hostname, port, use_tls, start_tls, tls_context):
+        self.connected = False
+        self.count = 0
+
+    async def connect(self):
+        self.connected = True
+
+    async def login(self, username, password):
+        FakeAsyncSMTP.sessions.append(self)
+        if self.refuse_logins_after is not None and len(self.sessions) > self.refuse_logins_after:
+            raise FakeAioSmtplib.SMTPAuthenticationError("logins refused")
+
+    async def sendmail(self, sender, recipients, message):
+        if not self.connected or self.count >= self.limit:
+            self.connected = False
+            raise FakeAioSmtplib.SMTPServerDisconnected("session limit reached")
+        self.count += 1
+        FakeAsyncSMTP.sent.append(recipients[0])
+
+    async def quit(self):
+        if not self.connected:
+            raise FakeAioSmtplib.SMTPServerDisconnected("not connected")
+        self.connected = False
+
+    def close(self):
+        self.connected = False
+
+
+class FakeAioSmtplib:
+    class SMTPException(Exception):
+        pass
+
+    class SMTPServerDisconnected(SMTPException):
+        pass
+
+    class SMTPAuthenticationError(SMTPException):
+        pass
+
+    SMTP = FakeAsyncSMTP
+
+
+def _sender() -> email_sender.EmailSender:
+    return email_sender.EmailSender('smtp.example.com', 587, True, 'me@example.com', 'secret')
+
+
+class SendBulkAsyncTest(unittest.TestCase):
+    RECORDS = [{'email': f'user{i}@example.com'} for i in range(5)]
+
+    def setUp(self):
+        FakeAsyncSMTP.sessions = []
+        FakeAsyncSMTP.sent = []
+        FakeAsyncSMTP.refuse_logins_after = None
+        patcher = mock.patch.object(email_sender, 'aiosmtplib', FakeAioSmtplib)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _send(self):
+        return asyncio.run(_sender().send_bulk_async(self.RECORDS, 'Sujet', 'Bonjour', concurrency=1))
+
+    def test_dropped_session_is_reopened_and_the_message_retried(self):
+        results = self._send()
+
+        self.assertEqual(results['success'], 5)
+        self.assertEqual(results['failed'], 0)
+        self.assertEqual(FakeAsyncSMTP.sent, [record['email'] for record in self.RECORDS])
+        self.assertEqual(len(FakeAsyncSMTP.sessions), 3)
+
+    def test_contact_is_kept_when_the_session_cannot_be_reopened(self):
+        FakeAsyncSMTP.refuse_logins_after = 1
+
+        results = self._send()
+
+        self.assertEqual(results['success'], 2)
+        self.assertEqual(results['failed'], 3)
+        self.assertCountEqual(
+            [error['email'] for error in results['errors']],
+            [record['email'] for record in self.RECORDS[2:]]
+        )
+
+
+class FakeServer:
+    """smtplib.SMTP stand-in; the server drops the session after ``limit`` messages."""
+
+    def __init__(self, limit: int = 1):
+        self.limit = limit
+        self.sent = []
+        self.closed = False
+
+    def sendmail(self, sender, recipients, message):
+        if len(self.sent) >= self.limit:
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self.sent.append(recipients[0])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+class SendPreparedTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = email_sender.SMTPConnectionPool()
+        self.sender = email_sender.EmailSender(
+            'smtp.example.com', 587, True, 'me@example.com', 'secret', pool=self.pool
+        )
+
+    def test_failed_reconnect_does_not_return_the_dropped_session_to_the_pool(self):
+        dropped = FakeServer(limit=1)
+        connects = [dropped]
+
+        def connect():
+            if connects:
+                return connects.pop()
+            raise smtplib.SMTPAuthenticationError(535, b'Authentication failed')
+
+        self.sender._connect = connect
+        self.sender.send_prepared(b'Subject: 1\r\n\r\nx', 'a@example.com')
+
+        # The idle session was dropped by the server and logging in again is refused
+        with self.assertRaises(smtplib.SMTPAuthenticationError):
+            self.sender.send_prepared(b'Subject: 2\r\n\r\nx', 'b@example.com')
+
+        self.assertTrue(dropped.closed)
+        self.assertFalse(self.pool._idle.get(self.sender.pool_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pandas as pd
+
+import gmail_sender
+
+
+class FakeAiohttp:
+    class ClientError(Exception):
+        pass
+
+    class TCPConnector:
+        def __init__(self, limit):
+            self.limit = limit
+
+    class ClientSession:
+        def __init__(self, connector):
+            self.connector = connector
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return False
+
+
+class SendBulkAsyncTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(gmail_sender, 'aiohttp', FakeAiohttp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sender = gmail_sender.GmailSender()
+        self.sender.service = object()
+        self.sender.creds = object()
+        self.sender.sender_email = 'me@example.com'
+        self.sender.refresh_token_if_stale = lambda: None
+        # No pacing: the test is about how many messages are held at once
+        self.sender._quota.rate = 0
+
+    def test_messages_are_built_by_a_fixed_pool_of_workers(self):
+        held = {'now': 0, 'peak': 0}
+        create_message = self.sender.create_message
+        sent = []
+
+        def counting_create_message(*args, **kwargs):
+            held['now'] += 1
+            held['peak'] = max(held['peak'], held['now'])
+            return create_message(*args, **kwargs)
+
+        async def send_message_async(session, message):
+            await asyncio.sleep(0)
+            held['now'] -= 1
+            sent.append(message)
+            return None
+
+        self.sender.create_message = counting_create_message
+        self.sender.send_message_async = send_message_async
+        records = [{'email': f'user{i}@example.com'} for i in range(50)] + [{'email': ''}]
+
+        results = asyncio.run(self.sender.send_bulk_async(records, 'Sujet', 'Bonjour', concurrency=4))
+
+        self.assertEqual(results['success'], 50)
+        self.assertEqual(results['errors'], [{'email': '', 'error': 'No email address'}])
+        self.assertEqual(len(sent), 50)
+        self.assertLessEqual(held['peak'], 4)
+
+
+class FakeBatch:
+    def __init__(self, callback, executed):
+        self.callback = callback
+        self.executed = executed
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self):
+        self.executed.append(len(self.requests))
+        for request_id in self.requests:
+            self.callback(request_id, {'id': request_id}, None)
+
+
+class FakeGmailService:
+    def __init__(self):
+        self.executed = []
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback, self.executed)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        return body
+
+
+class SendBulkEmailsTest(unittest.TestCase):
+    def test_full_batches_are_paid_per_send(self):
+        sender = gmail_sender.GmailSender()
+        sender.service = FakeGmailService()
+        sender.sender_email = 'me@example.com'
+        sender.refresh_token_if_stale = lambda: None
+        sender._quota = mock.Mock()
+        contacts = pd.DataFrame({'email': [f'user{i}@example.com' for i in range(150)]})
+
+        results = sender.send_bulk_emails(contacts, 'Sujet', 'Bonjour')
+
+        self.assertEqual(results['success'], 150)
+        self.assertEqual(sender.service.executed, [100, 50])
+        self.assertEqual(sender._quota.acquire.call_args_list, [mock.call(sender.SEND_QUOTA_COST)] * 150)
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def test_concurrent_writers_leave_one_complete_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'token.json')
+            contents = [str(i) * 100_000 for i in range(8)]
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda data: gmail_sender._atomic_write(path, data), contents))
+
+            with open(path) as f:
+                self.assertIn(f.read(), contents)
+            self.assertEqual(os.listdir(directory), ['token.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
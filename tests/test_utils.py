@@ -0,0 +1,136 @@
+import io
+import os
+import re
+import unittest
+from unittest import mock
+
+import utils
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'templates', 'email_template.html')
+
+# Tags the bleach branch drops without changing how the document renders
+_DOCUMENT_WRAPPER_RE = re.compile(r'<!DOCTYPE[^>]*>|</?(html|head|body)[^>]*>', re.IGNORECASE)
+
+
+def _upload(data: bytes, name: str):
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return utils.process_uploaded_file(buffer)
+
+
+class ProcessUploadedFileTest(unittest.TestCase):
+    def test_csv_upload_keeps_valid_unique_addresses(self):
+        df = _upload(b"Email,Nom\na@b.com,X\n a@b.com ,Y\nbad,Z\n,W\nc@d.fr,V\n", "contacts.csv")
+
+        self.assertEqual(df['email'].tolist(), ['a@b.com', 'c@d.fr'])
+        self.assertEqual(df['nom'].tolist(), ['X', 'V'])
+        self.assertEqual(df['email'].dtype, utils._EMAIL_DTYPE)
+
+    def test_txt_upload_uses_email_dtype(self):
+        df = _upload(b"e@x.com; f@y.org\n\ng@z.io,bad\ng@z.io\n", "contacts.txt")
+
+        self.assertEqual(df['email'].tolist(), ['e@x.com', 'f@y.org', 'g@z.io'])
+        self.assertEqual(df['email'].dtype, utils._EMAIL_DTYPE)
+
+    @unittest.skipIf(utils.python_calamine is None, "python-calamine is not installed")
+    def test_excel_upload_falls_back_when_calamine_rejects_the_file(self):
+        workbook = io.BytesIO()
+        utils.pd.DataFrame({'Email': ['a@b.com'], 'Nom': ['X']}).to_excel(workbook, index=False)
+        read_excel = utils.pd.read_excel
+
+        def reject_calamine(uploaded_file, engine=None, **kwargs):
+            if engine == 'calamine':
+                raise utils.python_calamine.CalamineError("unreadable workbook")
+            return read_excel(uploaded_file, engine=engine, **kwargs)
+
+        with mock.patch.object(utils.pd, 'read_excel', reject_calamine):
+            df = _upload(workbook.getvalue(), "contacts.xlsx")
+
+        self.assertEqual(df['email'].tolist(), ['a@b.com'])
+
+    @unittest.skipIf(utils.pa is None, "pyarrow is not installed")
+    def test_arrow_string_column_is_matched(self):
+        emails = utils.pd.Series(['a@b.com', 'bad', None]).astype('string[pyarrow]')
+
+        self.assertEqual(utils._match_emails(emails).tolist(), [True, False, False])
+
+
+class SanitizeHtmlContentTest(unittest.TestCase):
+    DANGEROUS = '<p>Bonjour<script>alert(1)</script><iframe src="x">cadre</iframe></p>'
+
+    def _sanitize_without_bleach(self, content: str) -> str:
+        with mock.patch.object(utils, 'bleach', None):
+            return utils.sanitize_html_content(content)
+
+    def test_fallback_removes_dangerous_elements_with_content(self):
+        self.assertEqual(self._sanitize_without_bleach(self.DANGEROUS), '<p>Bonjour</p>')
+
+    def test_fallback_handles_obfuscated_markup(self):
+        cases = {
+            '<p>a<SCRIPT\n type="text/javascript">alert(1)</script >b</p>': '<p>ab</p>',
+            '<p>a<svg><script>alert(1)</script></svg>b</p>': '<p>ab</p>',
+            '<p>a<svg onload=alert(1)>b</p>': '<p>ab</p>',
+            '<p>a<scr<script>x</script>ipt>alert(1)</script>b</p>': '<p>ab</p>',
+        }
+        for content, expected in cases.items():
+            with self.subTest(content=content):
+                self.assertEqual(self._sanitize_without_bleach(content), expected)
+
+    def test_fallback_drops_event_handlers_and_script_links(self):
+        sanitized = self._sanitize_without_bleach(
+            '<b onclick="steal()" class="x">x</b><a href=" JavaScript:steal()">y</a>'
+            '<img ONERROR=steal() src="cid:logo">'
+        )
+
+        self.assertEqual(sanitized, '<b class="x">x</b><a>y</a><img src="cid:logo">')
+
+    @unittest.skipIf(utils.bleach is None, "bleach[css] is not installed")
+    def test_bleach_handles_obfuscated_markup(self):
+        sanitized = utils.sanitize_html_content('<p>a<SCRIPT\n>alert(1)</script >b<svg><script>x</script></svg></p>')
+
+        self.assertEqual(sanitized, '<p>ab</p>')
+
+    @unittest.skipIf(utils.bleach is None, "bleach[css] is not installed")
+    def test_bleach_drops_style_attributes_without_css_sanitizer(self):
+        with mock.patch.object(utils, '_CSS_SANITIZER', None):
+            sanitized = utils.sanitize_html_content('<p style="color: red;" class="x">a</p>')
+
+        self.assertEqual(sanitized, '<p class="x">a</p>')
+
+    @unittest.skipIf(utils.bleach is None, "bleach[css] is not installed")
+    def test_bleach_removes_dangerous_elements_with_content(self):
+        self.assertEqual(utils.sanitize_html_content(self.DANGEROUS), '<p>Bonjour</p>')
+
+    @unittest.skipIf(utils.bleach is None, "bleach[css] is not installed")
+    def test_bleach_drops_event_handlers_and_script_links(self):
+        sanitized = utils.sanitize_html_content('<b onclick="steal()">x</b><a href="javascript:steal()">y</a>')
+
+        self.assertEqual(sanitized, '<b>x</b><a>y</a>')
+
+    @unittest.skipIf(utils.bleach is None, "bleach[css] is not installed")
+    def test_both_branches_keep_the_email_template(self):
+        with open(TEMPLATE_PATH, encoding='utf-8') as template_file:
+            template = template_file.read()
+        fragment = '<h4 style="color: red;">Titre</h4><table><tbody><tr><td>1</td></tr></tbody></table>'
+
+        for content in (template, fragment):
+            with self.subTest(content=content[:20]):
+                with_bleach = _DOCUMENT_WRAPPER_RE.sub('', utils.sanitize_html_content(content))
+                without_bleach = _DOCUMENT_WRAPPER_RE.sub('', self._sanitize_without_bleach(content))
+                self.assertEqual(with_bleach, without_bleach)
+
+
+class TemplateTest(unittest.TestCase):
+    def test_column_names_with_spaces_and_hyphens_are_rendered(self):
+        parts = utils.compile_template("{{prenom}}, {{Code Postal}} / {{e-mail}} {{inconnu}}")
+        values = {'prenom': 'Jean', 'Code Postal': '75001', 'e-mail': 'j@x.fr'}
+
+        self.assertEqual(utils.render_compiled(parts, values), "Jean, 75001 / j@x.fr {{inconnu}}")
+        self.assertEqual(
+            utils.get_template_variables("{{Code Postal}} {{nom}} {{Code Postal}}"),
+            ['Code Postal', 'nom']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,128 @@
+import base64
+import codecs
+import csv
+import functools
+import io
+import logging
+import mmap
+import os
+import numpy as np
 import pandas as pd
 import re
-from typing import List, Optional, Any
-import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.base import MIMEBase
+from typing import List, Optional, Any, Callable, Dict, Tuple
+
+# Receives a user-facing message, e.g. st.warning in the app
+Notifier = Callable[[str], None]
+
+logger = logging.getLogger(__name__)
+
+try:
+    import bleach
+except ImportError:  # optional; sanitize_html_content falls back to removing known dangerous markup
+    bleach = None
+
+try:
+    from bleach.css_sanitizer import ALLOWED_CSS_PROPERTIES, CSSSanitizer
+except ImportError:  # needs tinycss2 (bleach[css]); inline style attributes are dropped without it
+    ALLOWED_CSS_PROPERTIES = frozenset()
+    CSSSanitizer = None
+
+try:
+    import python_calamine
+except ImportError:  # optional; Excel files are read with the default pandas engine otherwise
+    python_calamine = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow ships with streamlit, but the pandas reader works without it
+    pa = None
+    pc = None
+    pa_csv = None
+
+# Addresses are kept in one contiguous Arrow buffer when pyarrow is available
+_EMAIL_DTYPE = 'string[pyarrow]' if pa is not None else 'string'
+
+# Encodings tried, in order, for CSV and TXT uploads
+_ENCODINGS = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+
+# Column name keywords mapped to the canonical contact columns, first match wins:
+# prenom comes before nom since 'prenom' and 'firstname' contain 'nom' and 'name'
+_COLUMN_RULES = (
+    (('email', 'mail'), 'email'),
+    (('prénom', 'prenom', 'firstname'), 'prenom'),
+    (('nom', 'name'), 'nom'),
+    (('entreprise', 'company', 'societe'), 'entreprise'),
+)
+
+# Uploads with at least this many addresses are validated on every core
+_PARALLEL_MATCH_ROWS = 1_000_000
+
+# Units used by format_file_size
+_SIZE_NAMES = ("B", "KB", "MB", "GB")
+
+# Template variables look like {{name}}; any column name fits, spaces and hyphens included
+_VAR_RE = re.compile(r'\{\{([^{}]+)\}\}')
+
+# Compiled once at import: validate_email runs for every row of an upload
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# One valid address per TXT token: tokens are lines split on commas, semicolons
+# and tabs, with surrounding whitespace ignored, as validate_email sees them
+_TXT_EMAIL_RE = re.compile(
+    r'(?:^|(?<=[,;\t]))[^\S\n]*([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})[^\S\n]*(?=[,;\t]|$)',
+    re.MULTILINE
+)
+
+# Markup kept by sanitize_html_content when bleach is installed; other tags are stripped
+# (their text is kept), and the dangerous elements are removed with their content first
+_ALLOWED_TAGS = frozenset({
+    'html', 'head', 'body', 'meta', 'title', 'style',
+    'p', 'br', 'hr', 'b', 'i', 'u', 's', 'strong', 'em', 'small', 'sub', 'sup', 'font', 'center',
+    'a', 'ul', 'ol', 'li', 'span', 'div', 'blockquote', 'pre', 'code',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'img',
+    'table', 'caption', 'colgroup', 'col', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th'
+})
+_ALLOWED_ATTRIBUTES = {
+    '*': ['style', 'class', 'id', 'align', 'dir', 'lang', 'title', 'width', 'height', 'bgcolor', 'valign'],
+    'a': ['href', 'name', 'target'],
+    'img': ['src', 'alt', 'border'],
+    'font': ['color', 'face', 'size'],
+    'meta': ['charset', 'name', 'content'],
+    'table': ['border', 'cellpadding', 'cellspacing'],
+    'td': ['colspan', 'rowspan'],
+    'th': ['colspan', 'rowspan'],
+}
+_ALLOWED_PROTOCOLS = frozenset({'http', 'https', 'mailto', 'tel', 'cid'})
+# Layout properties email templates rely on, on top of bleach's defaults
+_ALLOWED_CSS_PROPERTIES = frozenset({
+    'margin', 'margin-top', 'margin-right', 'margin-bottom', 'margin-left',
+    'padding', 'padding-top', 'padding-right', 'padding-bottom', 'padding-left',
+    'border', 'border-top', 'border-right', 'border-bottom', 'border-left', 'border-radius',
+    'border-width', 'border-style', 'background', 'max-width', 'min-width', 'box-shadow'
+})
+_CSS_SANITIZER = CSSSanitizer(allowed_css_properties=ALLOWED_CSS_PROPERTIES | _ALLOWED_CSS_PROPERTIES) if CSSSanitizer is not None else None
+# Without a CSS sanitizer bleach cannot vet style values, so the attribute is not allowed at all
+_ALLOWED_ATTRIBUTES_WITHOUT_STYLE = {
+    tag: [name for name in names if name != 'style'] for tag, names in _ALLOWED_ATTRIBUTES.items()
+}
+
+# Elements removed with their content by both branches of sanitize_html_content
+_DANGEROUS_TAGS = ('script', 'iframe', 'frame', 'frameset', 'object', 'embed', 'applet', 'form', 'svg', 'math', 'base')
+_DANGEROUS_TAG_RES = [
+    (
+        re.compile(rf'<{tag}\b[^>]*>.*?</{tag}\s*>', re.IGNORECASE | re.DOTALL),
+        re.compile(rf'</?{tag}\b[^>]*>', re.IGNORECASE)
+    )
+    for tag in _DANGEROUS_TAGS
+]
+# Opening tags and their attributes, for the fallback without bleach
+_OPENING_TAG_RE = re.compile(r'<[a-zA-Z][^>]*>')
+_ATTRIBUTE_RE = re.compile(r"""\s+([^\s=/>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?""")
+_SCRIPT_URL_RE = re.compile(r'^[\s\x00-\x1f"\']*(?:javascript|vbscript):', re.IGNORECASE)
 
 def validate_email(email: str) -> bool:
     """
@@ -16,8 +137,7 @@ def validate_email(email: str) -> bool:
     if not email or pd.isna(email):
         return False
     
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, str(email)) is not None
+    return isinstance(email, str) and _EMAIL_RE.match(email) is not None
 
 def validate_csv_columns(df: pd.DataFrame) -> bool:
     """
@@ -29,23 +149,126 @@ def validate_csv_columns(df: pd.DataFrame) -> bool:
     Returns:
         bool: True if DataFrame has required columns, False otherwise
     """
-    required_columns = ['email']
+    # Case-insensitive comparison, stopping at the first match
+    return any(col.lower() == 'email' for col in df.columns)
+
+def _match_emails(emails: pd.Series) -> pd.Series:
+    """
+    Check every address against _EMAIL_RE.
     
-    # Convert column names to lowercase for case-insensitive comparison
-    df_columns_lower = [col.lower() for col in df.columns]
+    Large Arrow-backed columns are split into one slice per core and matched
+    with Arrow's regex kernel, which releases the GIL, so the slices run in
+    parallel threads. Smaller or object columns use a single str.match.
     
-    for required_col in required_columns:
-        if required_col.lower() not in df_columns_lower:
-            return False
+    Args:
+        emails: Stripped addresses, missing values allowed
+        
+    Returns:
+        pd.Series: Boolean mask aligned with emails, False for missing values
+    """
+    workers = os.cpu_count() or 1
+    if pc is None or workers < 2 or len(emails) < _PARALLEL_MATCH_ROWS or emails.dtype != _EMAIL_DTYPE:
+        # The pattern string, not the compiled regex: Arrow strings only take str before pandas 3
+        return emails.str.match(_EMAIL_RE.pattern).fillna(False).astype(bool)
+    
+    values = pa.array(emails)
+    step = -(-len(values) // workers)
     
-    return True
+    def match_slice(start: int):
+        matched = pc.match_substring_regex(values.slice(start, step), _EMAIL_RE.pattern)
+        return pc.fill_null(matched, False).to_numpy(zero_copy_only=False)
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-match") as executor:
+        parts = list(executor.map(match_slice, range(0, len(values), step)))
+    
+    return pd.Series(np.concatenate(parts), index=emails.index)
 
-def process_uploaded_file(uploaded_file) -> pd.DataFrame:
+def _detect_encodings(uploaded_file, sample_size: int = 65536) -> List[str]:
+    """
+    Order the supported encodings by decoding only the start of the file.
+    
+    A failed attempt used to parse the whole file before raising; decoding a
+    sample in memory rules out the wrong encodings up front. The encodings
+    after the detected one are kept as fallbacks for invalid bytes past the sample.
+    
+    Args:
+        uploaded_file: File-like object, rewound to its start on return
+        sample_size: Number of bytes to decode
+        
+    Returns:
+        List[str]: Encodings to try, starting with the detected one
+    """
+    uploaded_file.seek(0)
+    sample = uploaded_file.read(sample_size)
+    uploaded_file.seek(0)
+    
+    # A UTF-8 byte order mark settles it; utf-8-sig also drops the mark from the text
+    if sample.startswith(codecs.BOM_UTF8):
+        return ['utf-8-sig'] + _ENCODINGS[1:]
+    
+    for index, encoding in enumerate(_ENCODINGS):
+        try:
+            # Incremental so a multibyte character cut by the sample limit is not an error
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return _ENCODINGS[index:]
+        except UnicodeDecodeError:
+            continue
+    
+    return []
+
+def _read_csv(uploaded_file, encoding: str) -> pd.DataFrame:
+    """
+    Read a CSV file with Arrow's multithreaded parser, falling back to pandas.
+    
+    Arrow is only used when its result matches what pandas would return:
+    date/time columns are re-read as strings and any input Arrow rejects
+    (invalid bytes for the encoding, ragged rows, duplicate headers) is
+    handed to pd.read_csv, which raises the usual errors.
+    
+    Args:
+        uploaded_file: File-like object positioned at the start of the CSV
+        encoding: Text encoding to decode the file with
+        
+    Returns:
+        pd.DataFrame: Parsed CSV data
+        
+    Raises:
+        UnicodeDecodeError: If the file cannot be decoded with this encoding
+    """
+    if pa_csv is not None:
+        try:
+            read_options = pa_csv.ReadOptions(encoding=encoding)
+            convert_options = pa_csv.ConvertOptions(strings_can_be_null=True)
+            table = pa_csv.read_csv(uploaded_file, read_options=read_options, convert_options=convert_options)
+            
+            # Arrow falls back to binary columns on undecodable bytes; let pandas raise instead
+            if any(pa.types.is_binary(field.type) for field in table.schema):
+                raise pa.ArrowInvalid("CSV contains bytes invalid for the encoding")
+            
+            # pandas keeps dates and times as text: do the same so templates render them verbatim
+            temporal = [field.name for field in table.schema if pa.types.is_temporal(field.type)]
+            if temporal:
+                uploaded_file.seek(0)
+                convert_options.column_types = {name: pa.string() for name in temporal}
+                table = pa_csv.read_csv(uploaded_file, read_options=read_options, convert_options=convert_options)
+            
+            if len(set(table.column_names)) == len(table.column_names):
+                return table.to_pandas()
+        except pa.ArrowInvalid:
+            pass
+        uploaded_file.seek(0)
+    
+    return pd.read_csv(uploaded_file, encoding=encoding)
+
+def process_uploaded_file(uploaded_file, warn: Optional[Notifier] = None,
+                          info: Optional[Notifier] = None) -> pd.DataFrame:
     """
     Process uploaded CSV, Excel or TXT file and return DataFrame.
     
     Args:
         uploaded_file: Streamlit uploaded file object
+        warn: Called with the message about removed invalid addresses, e.g. st.warning
+        info: Called with the message about removed duplicates, e.g. st.info
         
     Returns:
         pd.DataFrame: Processed DataFrame with contact data
@@ -58,14 +281,13 @@ def process_uploaded_file(uploaded_file) -> pd.DataFrame:
         file_extension = uploaded_file.name.split('.')[-1].lower()
         
         if file_extension == 'csv':
-            # Try different encodings for CSV files
-            encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+            # Try the encodings that can decode the start of the file
             df = None
             
-            for encoding in encodings:
+            for encoding in _detect_encodings(uploaded_file):
                 try:
                     uploaded_file.seek(0)  # Reset file pointer
-                    df = pd.read_csv(uploaded_file, encoding=encoding)
+                    df = _read_csv(uploaded_file, encoding)
                     break
                 except UnicodeDecodeError:
                     continue
@@ -74,14 +296,24 @@ def process_uploaded_file(uploaded_file) -> pd.DataFrame:
                 raise Exception("Unable to read CSV file with any supported encoding")
                 
         elif file_extension in ['xlsx', 'xls']:
-            df = pd.read_excel(uploaded_file)
+            df = None
+            
+            # calamine parses the workbook in Rust instead of building openpyxl cell objects
+            if python_calamine is not None:
+                try:
+                    df = pd.read_excel(uploaded_file, engine='calamine')
+                except (ValueError, python_calamine.CalamineError):  # pandas older than 2.2, or a file calamine rejects
+                    uploaded_file.seek(0)
+            
+            if df is None:
+                # openpyxl only reads xlsx; pandas picks xlrd for xls
+                df = pd.read_excel(uploaded_file, engine='openpyxl' if file_extension == 'xlsx' else None)
             
         elif file_extension == 'txt':
             # Handle TXT files - each line should be an email or comma/semicolon separated
-            encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
             content = None
             
-            for encoding in encodings:
+            for encoding in _detect_encodings(uploaded_file):
                 try:
                     uploaded_file.seek(0)  # Reset file pointer
                     content = uploaded_file.read().decode(encoding)
@@ -92,28 +324,9 @@ def process_uploaded_file(uploaded_file) -> pd.DataFrame:
             if content is None:
                 raise Exception("Unable to read TXT file with any supported encoding")
             
-            # Parse the content
-            emails = []
-            lines = content.strip().split('\n')
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # Check if line contains separators (comma, semicolon, tab)
-                if ',' in line or ';' in line or '\t' in line:
-                    # Split by multiple separators
-                    import re
-                    parts = re.split(r'[,;\t]+', line)
-                    for part in parts:
-                        part = part.strip()
-                        if part and validate_email(part):
-                            emails.append(part)
-                else:
-                    # Treat as single email
-                    if validate_email(line):
-                        emails.append(line)
+            # Extract every valid address in one regex sweep over the whole content;
+            # duplicates are kept so the common dedup below reports them
+            emails = _TXT_EMAIL_RE.findall(content)
             
             # Create DataFrame
             df = pd.DataFrame({'email': emails})
@@ -123,48 +336,42 @@ def process_uploaded_file(uploaded_file) -> pd.DataFrame:
         
         # Clean column names (only if not TXT file)
         if file_extension != 'txt':
-            df.columns = df.columns.str.strip()
+            df.columns = [col.strip() for col in df.columns]
             
             # Normalize column names to lowercase for easier matching
             column_mapping = {}
             for col in df.columns:
                 col_lower = col.lower()
-                if 'email' in col_lower or 'mail' in col_lower:
-                    column_mapping[col] = 'email'
-                elif 'nom' in col_lower or 'name' in col_lower:
-                    column_mapping[col] = 'nom'
-                elif 'prénom' in col_lower or 'prenom' in col_lower or 'firstname' in col_lower:
-                    column_mapping[col] = 'prenom'
-                elif 'entreprise' in col_lower or 'company' in col_lower or 'societe' in col_lower:
-                    column_mapping[col] = 'entreprise'
+                for keywords, canonical in _COLUMN_RULES:
+                    if any(keyword in col_lower for keyword in keywords):
+                        column_mapping[col] = canonical
+                        break
             
             # Rename columns if mapping found
             if column_mapping:
                 df = df.rename(columns=column_mapping)
         
-        # Remove rows with empty email addresses
+        # Clean the email column with one set of masks and slice the frame once:
+        # blank cells are dropped silently, invalid addresses and duplicates are reported
         if 'email' in df.columns:
-            df = df.dropna(subset=['email'])
-            df = df[df['email'].str.strip() != '']
-        
-        # Validate email addresses
-        if 'email' in df.columns:
-            valid_emails = df['email'].apply(validate_email)
-            invalid_count = (~valid_emails).sum()
+            stripped = df['email'].astype(_EMAIL_DTYPE).str.strip()
+            present = stripped.notna() & (stripped != '')
+            valid = present & _match_emails(stripped)
+            # Invalid rows become NA so they only collide with each other
+            duplicated = valid & stripped.where(valid).duplicated(keep='first')
             
-            if invalid_count > 0:
-                st.warning(f"⚠️ {invalid_count} adresses email invalides détectées et supprimées.")
+            invalid_count = (present & ~valid).sum()
+            if invalid_count > 0 and warn is not None:
+                warn(f"⚠️ {invalid_count} adresses email invalides détectées et supprimées.")
             
-            df = df[valid_emails].copy()
-        
-        # Remove duplicate email addresses
-        if 'email' in df.columns:
-            initial_count = len(df)
-            df = df.drop_duplicates(subset=['email'], keep='first')
-            duplicate_count = initial_count - len(df)
+            duplicate_count = duplicated.sum()
+            if duplicate_count > 0 and info is not None:
+                info(f"ℹ️ {duplicate_count} doublons supprimés.")
             
-            if duplicate_count > 0:
-                st.info(f"ℹ️ {duplicate_count} doublons supprimés.")
+            keep = valid & ~duplicated
+            df = df.loc[keep].assign(email=stripped[keep])
+            # Number the kept contacts 0..n-1 without copying the frame again
+            df.index = pd.RangeIndex(len(df))
         
         return df
         
@@ -184,12 +391,13 @@ def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     # Remove completely empty rows
     df = df.dropna(how='all')
     
-    # Strip whitespace from string columns
-    for col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].astype(str).str.strip()
-            # Replace 'nan' strings with actual NaN
-            df[col] = df[col].replace('nan', pd.NA)
+    # Strip whitespace from every string column at once
+    obj_cols = df.select_dtypes(include='object').columns
+    if len(obj_cols):
+        stripped = df[obj_cols].astype('string').apply(lambda col: col.str.strip())
+        # Missing cells are already NA; literal 'nan' strings become NA too
+        stripped = stripped.mask(stripped == 'nan', pd.NA)
+        df[obj_cols] = stripped.astype(object)
     
     return df
 
@@ -203,9 +411,115 @@ def get_template_variables(template: str) -> List[str]:
     Returns:
         List[str]: List of variable names found in template
     """
-    pattern = r'\{\{(\w+)\}\}'
-    variables = re.findall(pattern, template)
-    return list(set(variables))  # Remove duplicates
+    variables = _VAR_RE.findall(template)
+    return list(dict.fromkeys(variables))  # Remove duplicates, keeping first-seen order
+
+def render_template(template: str, values: Dict[str, str]) -> str:
+    """
+    Replace template variables with their values in a single pass.
+    
+    Args:
+        template: Template string with variables in {{variable}} format
+        values: Replacement value for each variable name
+        
+    Returns:
+        str: Rendered string; variables without a value are left as-is
+    """
+    return _VAR_RE.sub(lambda m: values.get(m.group(1), m.group(0)), template)
+
+def compile_template(template: str) -> List[str]:
+    """
+    Split a template once so it can be rendered for many contacts.
+    
+    Args:
+        template: Template string with variables in {{variable}} format
+        
+    Returns:
+        List[str]: Literal text at even indexes, variable names at odd indexes
+    """
+    return _VAR_RE.split(template)
+
+def compile_templates(subject_template: str, content_template: str,
+                      previous: Optional[tuple] = None) -> Tuple[Tuple[str, str], List[str], List[str], frozenset]:
+    """
+    Split a subject and content template pair, reusing an earlier result.
+    
+    A bulk send renders the same two templates for every contact: senders
+    keep the last result and pass it back, so the templates are only parsed
+    when they change.
+    
+    Args:
+        subject_template: Email subject template with variables
+        content_template: Email content template with variables
+        previous: Value returned by the last call, or None
+        
+    Returns:
+        Tuple[Tuple[str, str], List[str], List[str], frozenset]: The templates,
+        subject parts, content parts and the names of every variable they use
+    """
+    key = (subject_template, content_template)
+    if previous is not None and previous[0] == key:
+        return previous
+    
+    subject_parts = compile_template(subject_template)
+    content_parts = compile_template(content_template)
+    variables = frozenset(subject_parts[1::2] + content_parts[1::2])
+    return key, subject_parts, content_parts, variables
+
+def render_compiled(parts: List[str], values: Dict[str, str]) -> str:
+    """
+    Render a template split by compile_template().
+    
+    Args:
+        parts: Output of compile_template()
+        values: Replacement value for each variable name
+        
+    Returns:
+        str: Rendered string; variables without a value are left as-is
+    """
+    pieces = parts.copy()
+    for i in range(1, len(parts), 2):
+        name = parts[i]
+        pieces[i] = values.get(name, '{{' + name + '}}')
+    return ''.join(pieces)
+
+def contact_records(df: pd.DataFrame) -> List[Dict[str, str]]:
+    """
+    Convert contacts to dictionaries of ready-to-render strings.
+    
+    Values are converted to strings (NaN becoming "") in one vectorized pass,
+    and the frame is walked with itertuples instead of boxing every row into
+    a Series.
+    
+    Args:
+        df: DataFrame containing contact information
+        
+    Returns:
+        List[Dict[str, str]]: One dictionary per row mapping column names to strings
+    """
+    columns = df.columns.tolist()
+    # Going through object keeps str() formatting, e.g. for timestamps
+    rendered_values = df.astype(object).where(df.notna(), '').astype(str)
+    return [dict(zip(columns, row)) for row in rendered_values.itertuples(index=False, name=None)]
+
+def get_template_contacts(df: pd.DataFrame, *templates: str) -> List[Dict[str, str]]:
+    """
+    Build one dictionary per contact holding only the columns the templates use.
+    
+    Args:
+        df: DataFrame containing contact information
+        *templates: Templates (subject, content...) with variables in {{variable}} format
+        
+    Returns:
+        List[Dict[str, str]]: Contact dictionaries mapping 'email' and the
+        referenced columns to their string values (see contact_records)
+    """
+    referenced = set()
+    for template in templates:
+        referenced.update(get_template_variables(template))
+    
+    columns = [col for col in df.columns if col == 'email' or col in referenced]
+    return contact_records(df[columns])
 
 def validate_template_variables(template: str, available_columns: List[str]) -> List[str]:
     """
@@ -219,14 +533,9 @@ def validate_template_variables(template: str, available_columns: List[str]) ->
         List[str]: List of missing variables
     """
     template_vars = get_template_variables(template)
-    available_lower = [col.lower() for col in available_columns]
-    
-    missing_vars = []
-    for var in template_vars:
-        if var.lower() not in available_lower:
-            missing_vars.append(var)
+    available_lower = {col.lower() for col in available_columns}
     
-    return missing_vars
+    return [var for var in template_vars if var.lower() not in available_lower]
 
 def format_file_size(size_bytes: int) -> str:
     """
@@ -241,22 +550,96 @@ def format_file_size(size_bytes: int) -> str:
     if size_bytes == 0:
         return "0 B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    i = 0
-    size = float(size_bytes)
-    while size >= 1024 and i < len(size_names) - 1:
-        size /= 1024
-        i += 1
+    # Each unit is 2**10 times the previous one, so the bit length picks it directly
+    i = min(len(_SIZE_NAMES) - 1, max(0, (int(abs(size_bytes)).bit_length() - 1) // 10))
+    
+    return f"{size_bytes / (1 << (10 * i)):.1f} {_SIZE_NAMES[i]}"
+
+def encode_attachments(attachments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Base64-encode attachments once so every email of a campaign can reuse them.
+    
+    Attachments given by 'path' are memory-mapped rather than read into a
+    bytes copy, and the raw content is not kept once encoded, so only the
+    base64 text stays in memory.
+    
+    Args:
+        attachments: List of attachment dictionaries with 'filename' and
+            either 'content' (bytes) or 'path' (file on disk) keys
+        
+    Returns:
+        List[Dict[str, Any]]: Attachment dictionaries with 'filename', 'size'
+        (in bytes) and 'encoded', the MIME base64 body (76-character lines)
+    """
+    encoded_attachments = []
+    for attachment in attachments:
+        if 'path' in attachment:
+            with open(attachment['path'], 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        encoded = base64.encodebytes(mapped)
+                else:  # empty files cannot be mapped
+                    encoded = b''
+        else:
+            size = len(attachment['content'])
+            encoded = base64.encodebytes(attachment['content'])
+        
+        # Same encoding as email.encoders.encode_base64
+        encoded_attachments.append({
+            'filename': attachment['filename'],
+            'size': size,
+            'encoded': encoded.decode('ascii')
+        })
+    return encoded_attachments
+
+def build_attachment_parts(attachments: List[Dict[str, Any]],
+                           previous: Optional[tuple] = None) -> Tuple[List[Dict[str, Any]], List[MIMEBase]]:
+    """
+    Build the MIME parts of a set of attachments, reusing an earlier result.
+    
+    A bulk send passes the same attachments list for every contact: senders
+    keep the last result and pass it back, so each attachment is
+    base64-encoded once and its part attached to every message; serializing
+    a message does not modify its parts.
+    
+    Args:
+        attachments: List of attachment dictionaries with 'filename' and either 'content', a file 'path' or a pre-encoded 'encoded' body
+        previous: Value returned by the last call, or None
+        
+    Returns:
+        Tuple[List[Dict[str, Any]], List[MIMEBase]]: The attachments list and
+        one base64 attachment part per attachment
+    """
+    if previous is not None and previous[0] is attachments:
+        return previous
     
-    return f"{size:.1f} {size_names[i]}"
+    parts = []
+    for attachment in attachments:
+        if 'encoded' not in attachment:
+            # Raw 'content' or a 'path' to memory-map, encoded once for the whole campaign
+            attachment = encode_attachments([attachment])[0]
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment['encoded'])
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', f'attachment; filename={attachment["filename"]}')
+        parts.append(part)
+    
+    # Keeping a reference to the list also keeps its identity from being reused
+    return attachments, parts
 
 def create_sample_csv() -> pd.DataFrame:
     """
     Create a sample CSV DataFrame for demonstration.
     
     Returns:
-        pd.DataFrame: Sample DataFrame with contact data
+        pd.DataFrame: Sample DataFrame with contact data, a copy the caller may modify
     """
+    return _sample_contacts().copy()
+
+@functools.lru_cache(maxsize=1)
+def _sample_contacts() -> pd.DataFrame:
+    """Build the sample contacts once per process; shared, so never modified."""
     sample_data = {
         'email': [
             'exemple1@email.com',
@@ -295,24 +678,74 @@ def export_logs_to_csv(logs: List[dict]) -> str:
     if not logs:
         return "email,status,timestamp,error\n"
     
-    df = pd.DataFrame(logs)
-    return df.to_csv(index=False)
+    # Write the rows directly instead of building a DataFrame just to serialize it;
+    # columns are every key seen, in first-seen order, as pandas would lay them out
+    fieldnames = list(dict.fromkeys(key for log in logs for key in log))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(logs)
+    return buffer.getvalue()
 
 def sanitize_html_content(content: str) -> str:
     """
     Basic HTML sanitization for email content.
     
+    Script, iframe, object, embed, form, svg and similar elements are
+    removed with their content. With bleach installed the rest is then
+    parsed once and only allowlisted tags, attributes and CSS properties
+    are kept (style attributes are dropped if tinycss2 is missing); the
+    document wrapper (doctype, html, head and body tags) is not kept
+    either. Without bleach, event handler attributes and javascript: or
+    vbscript: URLs are removed from the remaining tags.
+    
     Args:
         content: HTML content to sanitize
         
     Returns:
         str: Sanitized HTML content
     """
-    # Remove potentially dangerous tags
-    dangerous_tags = ['script', 'iframe', 'object', 'embed', 'form']
-    
-    for tag in dangerous_tags:
-        content = re.sub(f'<{tag}[^>]*>.*?</{tag}>', '', content, flags=re.IGNORECASE | re.DOTALL)
-        content = re.sub(f'<{tag}[^>]*/?>', '', content, flags=re.IGNORECASE)
+    content = _remove_dangerous_elements(content)
+    if bleach is not None:
+        if _CSS_SANITIZER is None:
+            _warn_once("tinycss2 is not installed (bleach[css]); style attributes are removed from HTML content")
+        return bleach.clean(
+            content, tags=_ALLOWED_TAGS, protocols=_ALLOWED_PROTOCOLS,
+            attributes=_ALLOWED_ATTRIBUTES if _CSS_SANITIZER is not None else _ALLOWED_ATTRIBUTES_WITHOUT_STYLE,
+            css_sanitizer=_CSS_SANITIZER, strip=True, strip_comments=False
+        )
     
+    _warn_once("bleach is not installed; HTML content is only partially sanitized")
+    return _OPENING_TAG_RE.sub(_strip_unsafe_attributes, content)
+
+def _remove_dangerous_elements(content: str) -> str:
+    """Remove the dangerous elements and any stray tag of theirs, until none is left."""
+    while True:
+        # Removing one element can join the halves of another, e.g. <scr<script>x</script>ipt>
+        removed = 0
+        for element_re, _ in _DANGEROUS_TAG_RES:
+            content, count = element_re.subn('', content)
+            removed += count
+        if removed:
+            continue
+        for _, tag_re in _DANGEROUS_TAG_RES:
+            content, count = tag_re.subn('', content)
+            removed += count
+        if not removed:
+            break
     return content
+
+def _strip_unsafe_attributes(tag: re.Match) -> str:
+    """Drop event handler attributes and javascript:/vbscript: URLs from one opening tag."""
+    def keep(attribute: re.Match) -> str:
+        name, value = attribute.group(1), attribute.group(2) or ''
+        if name.lower().startswith('on') or _SCRIPT_URL_RE.match(value):
+            return ''
+        return attribute.group(0)
+    
+    return _ATTRIBUTE_RE.sub(keep, tag.group(0))
+
+@functools.lru_cache(maxsize=None)
+def _warn_once(message: str) -> None:
+    """Log a degraded-mode warning the first time it happens only."""
+    logger.warning(message)